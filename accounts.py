@@ -0,0 +1,97 @@
+import glob
+import os
+import time
+import logging
+from utils import COOKIES_FILE_PATH, get_cookie_provider
+
+# --- 配置常量 ---
+COOKIES_DIR = "cookies"
+ACCOUNT_COOKIES_PATTERN = "bilibili_cookies_*.json" # 每个账号一个文件，文件名带DedeUserID
+ACCOUNT_COOLDOWN = 300.0 # 账号被限流后暂停使用的时间（秒）
+
+logger = logging.getLogger(__name__)
+
+def account_cookies_path(dede_user_id, cookies_dir = COOKIES_DIR):
+    return os.path.join(cookies_dir, f"bilibili_cookies_{dede_user_id}.json")
+
+class Account:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.provider = get_cookie_provider(file_path)
+        self.last_used = 0.0
+        self.blocked_until = 0.0
+
+    @property
+    def name(self):
+        return os.path.basename(self.file_path)
+
+class AccountPool:
+    """
+    多账号Cookie池：每次请求取最久未使用且未被限流的账号，被限流的账号暂时移出。
+    shared为poll.backoff.SharedBackoff时账号的暂停与其他进程共享。
+    """
+    def __init__(self, file_paths, shared = None):
+        self.accounts = [Account(path) for path in file_paths]
+        self.shared = shared
+
+    @classmethod
+    def discover(cls, cookies_dir = COOKIES_DIR, shared = None):
+        """
+        加载cookies目录下所有账号文件；没有时退回到单账号的COOKIES_FILE_PATH。
+        """
+        paths = sorted(glob.glob(os.path.join(cookies_dir, ACCOUNT_COOKIES_PATTERN)))
+        if not paths:
+            paths = [COOKIES_FILE_PATH]
+        logger.info("账号池: %s 个账号", len(paths))
+        return cls(paths, shared)
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def _sync(self):
+        """
+        读取其他进程暂停的账号。
+        """
+        if self.shared is None:
+            return
+        blocked = self.shared.blocked("account:")
+        offset = time.monotonic() - time.time()
+        for account in self.accounts:
+            until = blocked.get("account:" + account.name)
+            if until is not None:
+                account.blocked_until = max(account.blocked_until, until + offset)
+
+    def acquire(self):
+        """
+        返回最久未使用的可用账号；全部被限流时返回最早解除限流的那个。
+        """
+        self._sync()
+        now = time.monotonic()
+        available = [a for a in self.accounts if a.blocked_until <= now]
+        if available:
+            account = min(available, key=lambda a: a.last_used)
+        else:
+            account = min(self.accounts, key=lambda a: a.blocked_until)
+        account.last_used = now
+        return account
+
+    def evict(self, account, seconds = ACCOUNT_COOLDOWN):
+        """
+        账号被限流，暂停使用seconds秒。
+        """
+        account.blocked_until = time.monotonic() + seconds
+        if self.shared is not None:
+            self.shared.set("account:" + account.name, time.time() + seconds)
+        logger.warning("账号 %s 被限流，暂停使用 %.0f 秒", account.name, seconds)
+
+    def invalidate(self):
+        """
+        让所有账号在下次使用时重新检查Cookie文件。
+        """
+        for account in self.accounts:
+            account.provider.invalidate()
+
+    def all_blocked(self):
+        self._sync()
+        now = time.monotonic()
+        return all(a.blocked_until > now for a in self.accounts)
@@ -0,0 +1,78 @@
+"""
+tag匹配的微基准：对比原来的嵌套循环与编译后的TagMatcher。
+
+用法: python -m bench.matcher [关键词数量] [tag数量]
+"""
+import random
+import string
+import sys
+import time
+from poll.matcher import TagMatcher
+from utils import TAG_SET
+
+CJK = [chr(c) for c in range(0x4e00, 0x4e00 + 2000)]
+
+def random_word(rng, length):
+    if rng.random() < 0.5:
+        return ''.join(rng.choice(CJK) for _ in range(length))
+    return ''.join(rng.choice(string.ascii_letters) for _ in range(length))
+
+def make_keywords(rng, count):
+    keywords = set(TAG_SET)
+    while len(keywords) < count:
+        keywords.add(random_word(rng, rng.randint(1, 6)).lower())
+    return keywords
+
+def make_tags(rng, count, keywords, hit_ratio=0.05):
+    keywords = sorted(keywords)
+    tags = []
+    for _ in range(count):
+        name = random_word(rng, rng.randint(2, 12))
+        if rng.random() < hit_ratio:
+            name += rng.choice(keywords).upper()
+        tags.append({'tag_name': name})
+    return tags
+
+def nested_loop(tags, keywords):
+    # 原 poll_videos.test_tag 的实现，对每个tag逐一检查
+    hits = 0
+    for tag in tags:
+        for expected in keywords:
+            if expected in tag['tag_name'].lower():
+                hits += 1
+                break
+    return hits
+
+def compiled(tags, matcher):
+    hits = 0
+    for tag in tags:
+        if matcher.match(tag['tag_name']) is not None:
+            hits += 1
+    return hits
+
+def timeit(func, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main(num_keywords=300, num_tags=20000):
+    rng = random.Random(0)
+    keywords = make_keywords(rng, num_keywords)
+    tags = make_tags(rng, num_tags, keywords)
+
+    start = time.perf_counter()
+    matcher = TagMatcher(keywords)
+    build_time = time.perf_counter() - start
+
+    loop_time, loop_hits = timeit(nested_loop, tags, keywords)
+    matcher_time, matcher_hits = timeit(compiled, tags, matcher)
+    print(f"关键词: {len(keywords)}, tag: {len(tags)}")
+    print(f"嵌套循环:   {loop_time * 1000:8.2f} ms, 命中 {loop_hits}")
+    print(f"TagMatcher: {matcher_time * 1000:8.2f} ms, 命中 {matcher_hits} (编译 {build_time * 1000:.2f} ms)")
+    print(f"加速比: {loop_time / matcher_time:.1f}x")
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
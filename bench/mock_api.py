@@ -0,0 +1,201 @@
+"""
+本地模拟的B站接口，用于离线测试和基准测试：
+推荐列表 index/top/feed/rcmd、视频tag view/detail/tag、扫码登录的 qrcode/generate 和 qrcode/poll。
+
+用法: python -m bench.mock_api [--port 18080] [--latency 0.05] [--jitter 0.02] ...
+然后设置 BILI_API_BASE=http://127.0.0.1:18080 BILI_PASSPORT_BASE=http://127.0.0.1:18080 再运行轮询或登录。
+"""
+import argparse
+import asyncio
+import random
+import uuid
+import zlib
+from collections import Counter
+from aiohttp import web
+from poll.seen import av2bv, bv2av
+
+MATCH_TAGS = ['MyGO!!!!!', 'BanG Dream!', 'Ave Mujica', '千早爱音', '长崎爽世']
+OTHER_TAGS = ['游戏', '音乐', '生活', '知识', '科技', '美食', '动画', '鬼畜', '日常', '搞笑']
+FIRST_AV = 100000000
+
+CONFIG_KEY = web.AppKey("config", dict)
+STATE_KEY = web.AppKey("state", dict)
+
+def default_config(**overrides):
+    config = {
+        "latency": 0.05,        # 每个请求的基础延迟（秒）
+        "jitter": 0.02,         # 额外的随机延迟上限（秒）
+        "slow_rate": 0.0,       # 响应特别慢（长尾）的概率
+        "slow_latency": 1.0,    # 慢响应额外的延迟（秒）
+        "error_rate": 0.0,      # 返回HTTP 500的概率
+        "rate_limit_rate": 0.0, # 返回-352风控的概率
+        "repeat_ratio": 0.3,    # 推荐列表中重复出现（热门）视频的比例
+        "match_ratio": 0.1,     # 视频tag命中关键词的概率
+        "title_ratio": 0.3,     # 命中的视频中标题里也带着关键词的比例
+        "fan_owner_ratio": 0.05, # 专门投稿相关视频的UP主比例，他们的视频90%命中
+        "page_size": 10,        # 推荐列表默认每页数量
+        "popular_pool": 50,     # 热门视频池大小
+        "scan_polls": 2,        # 扫码登录：前几次poll返回未扫码，之后已扫码、成功
+        "seed": 0,
+    }
+    config.update(overrides)
+    return config
+
+def owner_mid(av):
+    return av % 997
+
+def is_match(bvid, config):
+    # 同一个视频每次返回相同的tag
+    mid = owner_mid(bv2av(bvid))
+    ratio = 0.9 if zlib.crc32(str(mid).encode()) % 10000 < config["fan_owner_ratio"] * 10000 else config["match_ratio"]
+    return zlib.crc32(bvid.encode()) % 10000 < ratio * 10000
+
+def video_tags(bvid, config):
+    rng = random.Random(bvid)
+    names = rng.sample(OTHER_TAGS, 3)
+    if is_match(bvid, config):
+        names.append(rng.choice(MATCH_TAGS))
+    return names
+
+async def simulate(request):
+    """
+    模拟网络延迟和错误，返回需要直接返回的错误响应或None。
+    """
+    config = request.app[CONFIG_KEY]
+    state = request.app[STATE_KEY]
+    state["requests"][request.path] += 1
+    rng = state["rng"]
+    delay = config["latency"] + rng.uniform(0, config["jitter"])
+    if rng.random() < config["slow_rate"]:
+        delay += config["slow_latency"]
+    await asyncio.sleep(delay)
+    if rng.random() < config["error_rate"]:
+        state["errors"][request.path] += 1
+        return web.Response(status=500, text="mock error")
+    if rng.random() < config["rate_limit_rate"]:
+        state["errors"][request.path] += 1
+        return web.json_response({"code": -352, "message": "风控校验失败"})
+    return None
+
+def make_item(av, config):
+    bvid = av2bv(av)
+    mid = owner_mid(av)
+    title = f"模拟视频 {av}"
+    if zlib.crc32(bvid.encode()[::-1]) % 10000 < config["title_ratio"] * 10000:
+        names = video_tags(bvid, config)
+        if len(names) > 3:
+            title += " " + names[-1]
+    return {
+        "id": av,
+        "bvid": bvid,
+        "title": title,
+        "owner": {"mid": mid, "name": f"UP主{mid}"},
+        "stat": {"view": av % 100000, "like": av % 1000},
+    }
+
+async def recommend_handler(request):
+    error = await simulate(request)
+    if error is not None:
+        return error
+    config = request.app[CONFIG_KEY]
+    state = request.app[STATE_KEY]
+    rng = state["rng"]
+    size = int(request.query.get("ps") or config["page_size"])
+    items = []
+    for _ in range(size):
+        if state["next_av"] > FIRST_AV and rng.random() < config["repeat_ratio"]:
+            pool = min(config["popular_pool"], state["next_av"] - FIRST_AV)
+            av = FIRST_AV + rng.randrange(pool)
+        else:
+            av = state["next_av"]
+            state["next_av"] += 1
+        items.append(make_item(av, config))
+    return web.json_response({"code": 0, "message": "0", "ttl": 1, "data": {"item": items}})
+
+async def tag_handler(request):
+    error = await simulate(request)
+    if error is not None:
+        return error
+    config = request.app[CONFIG_KEY]
+    bvid = request.query.get("bvid", "")
+    names = video_tags(bvid, config)
+    tags = [{"tag_id": zlib.crc32(name.encode()), "tag_name": name, "tag_type": "old_channel"} for name in names]
+    return web.json_response({"code": 0, "message": "0", "ttl": 1, "data": tags})
+
+async def qrcode_generate_handler(request):
+    error = await simulate(request)
+    if error is not None:
+        return error
+    state = request.app[STATE_KEY]
+    qrcode_key = uuid.uuid4().hex
+    state["qrcodes"][qrcode_key] = 0
+    return web.json_response({"code": 0, "message": "0", "data": {
+        "url": f"https://account.bilibili.com/h5/account-h5/auth/scan-web?qrcode_key={qrcode_key}",
+        "qrcode_key": qrcode_key,
+    }})
+
+async def qrcode_poll_handler(request):
+    error = await simulate(request)
+    if error is not None:
+        return error
+    config = request.app[CONFIG_KEY]
+    state = request.app[STATE_KEY]
+    qrcode_key = request.query.get("qrcode_key")
+    if qrcode_key not in state["qrcodes"]:
+        data = {"url": "", "refresh_token": "", "timestamp": 0, "code": 86038, "message": "二维码已失效"}
+        return web.json_response({"code": 0, "message": "0", "data": data})
+    polls = state["qrcodes"][qrcode_key] = state["qrcodes"][qrcode_key] + 1
+    if polls <= config["scan_polls"]:
+        data = {"url": "", "refresh_token": "", "timestamp": 0, "code": 86101, "message": "未扫码"}
+    elif polls == config["scan_polls"] + 1:
+        data = {"url": "", "refresh_token": "", "timestamp": 0, "code": 86090, "message": "二维码已扫码未确认"}
+    else:
+        state["logins"] += 1
+        uid = 10000 + state["logins"]
+        url = (f"https://passport.biligame.com/x/passport-login/web/crossDomain?DedeUserID={uid}"
+               f"&DedeUserID__ckMd5=mock&Expires=0&SESSDATA=mock{uid}&bili_jct=mock&gourl=https%3A%2F%2Fwww.bilibili.com")
+        data = {"url": url, "refresh_token": f"token{uid}", "timestamp": 0, "code": 0, "message": ""}
+        del state["qrcodes"][qrcode_key]
+    return web.json_response({"code": 0, "message": "0", "data": data})
+
+async def stats_handler(request):
+    state = request.app[STATE_KEY]
+    return web.json_response({
+        "requests": dict(state["requests"]),
+        "errors": dict(state["errors"]),
+        "videos": state["next_av"] - FIRST_AV,
+    })
+
+def create_app(**overrides):
+    app = web.Application()
+    config = default_config(**overrides)
+    app[CONFIG_KEY] = config
+    app[STATE_KEY] = {
+        "rng": random.Random(config["seed"]),
+        "next_av": FIRST_AV,
+        "requests": Counter(),
+        "errors": Counter(),
+        "qrcodes": {},
+        "logins": 0,
+    }
+    app.router.add_get('/x/web-interface/index/top/feed/rcmd', recommend_handler)
+    app.router.add_get('/x/web-interface/view/detail/tag', tag_handler)
+    app.router.add_get('/x/passport-login/web/qrcode/generate', qrcode_generate_handler)
+    app.router.add_get('/x/passport-login/web/qrcode/poll', qrcode_poll_handler)
+    app.router.add_get('/__stats', stats_handler)
+    return app
+
+def add_config_arguments(parser):
+    for key, value in default_config().items():
+        parser.add_argument('--' + key.replace('_', '-'), type=type(value), default=value)
+
+def config_from_args(args):
+    return {key: getattr(args, key) for key in default_config()}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="模拟B站接口")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18080)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(create_app(**config_from_args(args)), host=args.host, port=args.port)
@@ -0,0 +1,193 @@
+"""
+离线吞吐基准：在子进程里启动 bench/mock_api.py 的模拟接口，把轮询或登录服务指向它，
+统计每秒检查的视频数、每秒请求数、各接口p50/p99延迟和峰值内存。
+
+用法: python -m bench.throughput poll [--polls 50] [--feeds 3] [--concurrency 8] [--latency 0.05] ...
+      python -m bench.throughput login [--logins 20] [--transport sse|poll]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from collections import defaultdict
+from aiohttp import web
+import aiohttp
+from bench.mock_api import create_app as create_mock_app, add_config_arguments, config_from_args
+
+def run_mock_server(port, config):
+    web.run_app(create_mock_app(**config), host='127.0.0.1', port=port, print=None)
+
+async def wait_for_server(base_url, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/__stats") as response:
+                    return await response.json()
+            except aiohttp.ClientError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.05)
+
+async def fetch_stats(base_url):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{base_url}/__stats") as response:
+            return await response.json()
+
+class LatencyRecorder:
+    """
+    通过aiohttp的TraceConfig记录每个请求的耗时，按URL路径分组。
+    """
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_start.append(self.on_request_start)
+        self.trace_config.on_request_end.append(self.on_request_end)
+
+    async def on_request_start(self, session, context, params):
+        context.start = time.perf_counter()
+
+    async def on_request_end(self, session, context, params):
+        self.latencies[params.url.path].append(time.perf_counter() - context.start)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def report(title, elapsed, counters, recorder, stats):
+    total_requests = sum(stats["requests"].values())
+    print("-------------------------------------------------------")
+    print(title)
+    print(f"耗时: {elapsed:.2f} s")
+    for name, value in counters.items():
+        print(f"{name}: {value} ({value / elapsed:.1f}/s)")
+    print(f"上游请求: {total_requests} ({total_requests / elapsed:.1f}/s), 错误: {sum(stats['errors'].values())}")
+    for path, values in sorted(recorder.latencies.items()):
+        print(f"  {path}: n={len(values)}, p50={percentile(values, 0.5) * 1000:.1f} ms, "
+              f"p99={percentile(values, 0.99) * 1000:.1f} ms")
+    # Linux下ru_maxrss的单位是KB
+    print(f"峰值RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    print("-------------------------------------------------------")
+
+async def bench_poll(args, base_url):
+    from client import create_session, get_policy
+    from accounts import AccountPool
+    from poll.poll_videos import poll_videos
+    from poll.seen import SeenSet
+    from poll.owners import OwnerStats
+    import metrics
+
+    workdir = tempfile.mkdtemp(prefix="bench_poll_")
+    cookie_path = os.path.join(workdir, "bilibili_cookies.json")
+    with open(cookie_path, 'w', encoding='utf-8') as f:
+        json.dump({"SESSDATA": "bench", "DedeUserID": "1"}, f)
+
+    recorder = LatencyRecorder()
+    session = create_session(trace_configs=[recorder.trace_config])
+    seen = SeenSet()
+    metrics.reset()
+    get_policy("tags").hedge = args.hedge
+    found = 0
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            async for _ in poll_videos(args.max_videos or None, args.polls, args.concurrency, session=session, seen=seen,
+                                       feeds=args.feeds, accounts=AccountPool([cookie_path]), owners=OwnerStats(),
+                                       prefilter=not args.no_prefilter):
+                found += 1
+    finally:
+        elapsed = time.perf_counter() - start
+        await session.close()
+    stats = await fetch_stats(base_url)
+    report(f"轮询基准: {args.polls} 次轮询, 每次 {args.feeds} 页, tag并发 {args.concurrency}", elapsed,
+           {"检查的视频": len(seen), "命中": found,
+            "省下的tag请求": metrics.get("bili_tag_calls_avoided_total", reason="title")
+                           + metrics.get("bili_tag_calls_avoided_total", reason="early_stop"),
+            "重试": sum(metrics.get("bili_http_retries_total", endpoint=name) for name in ("recommend", "tags")),
+            "对冲请求": metrics.get("bili_http_hedged_total", endpoint="tags"),
+            "失败": metrics.get("bili_videos_total", result="failed")}, recorder, stats)
+
+async def bench_login(args, base_url):
+    import login.main as login_main
+
+    login_main.COOKIES_DIR = tempfile.mkdtemp(prefix="bench_login_")
+    runner = web.AppRunner(login_main.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', args.login_port)
+    await site.start()
+    login_url = f"http://127.0.0.1:{args.login_port}"
+
+    recorder = LatencyRecorder()
+
+    async def browser(session):
+        async with session.get(f"{login_url}/generate_qrcode") as response:
+            qrcode_key = (await response.json())["qrcode_key"]
+        async with session.get(f"{login_url}/qrcode_image", params={"qrcode_key": qrcode_key}) as response:
+            await response.read()
+        if args.transport == 'sse':
+            async with session.get(f"{login_url}/scan_events", params={"qrcode_key": qrcode_key}) as response:
+                async for line in response.content:
+                    if line.startswith(b"data: "):
+                        data = json.loads(line[len(b"data: "):])
+                        if data.get("code") != 86101 and data.get("code") != 86090:
+                            return data.get("code") == 0
+            return False
+        while True:
+            async with session.get(f"{login_url}/check_scan", params={"qrcode_key": qrcode_key}) as response:
+                data = await response.json()
+            if data.get("code") != 86101 and data.get("code") != 86090:
+                return data.get("code") == 0
+            await asyncio.sleep(args.check_interval)
+
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            async with aiohttp.ClientSession(trace_configs=[recorder.trace_config]) as session:
+                results = await asyncio.gather(*(browser(session) for _ in range(args.logins)))
+    finally:
+        elapsed = time.perf_counter() - start
+        await runner.cleanup()
+    stats = await fetch_stats(base_url)
+    report(f"登录基准: {args.logins} 个并发登录 ({args.transport})", elapsed, {"成功登录": sum(results)}, recorder, stats)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="离线吞吐基准")
+    parser.add_argument('scenario', choices=['poll', 'login'])
+    parser.add_argument('--mock-port', type=int, default=18080)
+    parser.add_argument('--polls', type=int, default=50)
+    parser.add_argument('--feeds', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--max-videos', type=int, default=0, help="轮询基准找到多少个视频后停止，0表示不限")
+    parser.add_argument('--no-prefilter', action='store_true', help="轮询基准不使用标题/UP主预筛选")
+    parser.add_argument('--hedge', action='store_true', help="轮询基准对tag请求启用对冲")
+    parser.add_argument('--logins', type=int, default=20)
+    parser.add_argument('--login-port', type=int, default=18090)
+    parser.add_argument('--check-interval', type=float, default=0.1)
+    parser.add_argument('--transport', choices=['sse', 'poll'], default='sse', help="登录基准中浏览器获取扫码状态的方式")
+    add_config_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    base_url = f"http://127.0.0.1:{args.mock_port}"
+    # 必须在导入poll/login模块之前设置，接口地址在导入时确定
+    os.environ["BILI_API_BASE"] = base_url
+    os.environ["BILI_PASSPORT_BASE"] = base_url
+    server = multiprocessing.Process(target=run_mock_server, args=(args.mock_port, config_from_args(args)), daemon=True)
+    server.start()
+    try:
+        asyncio.run(wait_for_server(base_url))
+        scenario = bench_poll if args.scenario == 'poll' else bench_login
+        asyncio.run(scenario(args, base_url))
+    finally:
+        server.terminate()
+        server.join()
+
+if __name__ == '__main__':
+    main()
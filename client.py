@@ -0,0 +1,169 @@
+import aiohttp
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- 连接池配置 ---
+CONNECTION_LIMIT = 100          # 连接池总连接数上限
+CONNECTION_LIMIT_PER_HOST = 16  # 单个主机（如api.bilibili.com）的连接数上限
+DNS_CACHE_TTL = 300             # DNS解析结果缓存时间（秒）
+KEEPALIVE_TIMEOUT = 30          # 空闲连接保持时间（秒）
+
+# --- 请求策略 ---
+RETRY_STATUSES = {500, 502, 503, 504} # 可以重试的HTTP状态码
+LATENCY_WINDOW = 200    # 计算p95延迟时使用最近多少次请求
+HEDGE_MIN_SAMPLES = 20  # 样本不够时不发对冲请求
+HEDGE_MIN_DELAY = 0.05  # 对冲请求最早在多少秒后发出
+
+_shared_session = None
+
+def create_session(**kwargs):
+    """
+    创建一个带有调优过的TCPConnector的ClientSession，并记录每个请求的延迟和状态码。
+    必须在事件循环中调用。
+    """
+    kwargs['trace_configs'] = list(kwargs.get('trace_configs') or []) + [metrics.trace_config()]
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTION_LIMIT,
+        limit_per_host=CONNECTION_LIMIT_PER_HOST,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+    )
+    return aiohttp.ClientSession(connector=connector, **kwargs)
+
+def get_session():
+    """
+    返回进程内共享的ClientSession，不存在或已关闭时重新创建。
+    """
+    global _shared_session
+    if _shared_session is None or _shared_session.closed:
+        _shared_session = create_session()
+    return _shared_session
+
+async def close_session():
+    """
+    关闭共享的ClientSession，释放连接池。
+    """
+    global _shared_session
+    if _shared_session is not None and not _shared_session.closed:
+        await _shared_session.close()
+    _shared_session = None
+
+@asynccontextmanager
+async def shared_session():
+    """
+    在一次运行（asyncio.run）内使用共享会话，退出时关闭。
+    """
+    try:
+        yield get_session()
+    finally:
+        await close_session()
+
+# B站风控：HTTP 412，或者业务码 -352 / -412
+RATE_LIMIT_STATUS = 412
+RATE_LIMIT_CODES = {-352, -412}
+
+class RateLimited(Exception):
+    """
+    请求被B站限流/风控拦截。
+    """
+
+def check_rate_limit(status, code=None, endpoint=""):
+    """
+    被限流时抛出RateLimited，同时统计B站返回的非0业务码。
+    """
+    if code:
+        metrics.inc("bili_api_errors_total", endpoint=endpoint, code=code)
+    if status == RATE_LIMIT_STATUS or code in RATE_LIMIT_CODES:
+        raise RateLimited(f"status={status}, code={code}")
+
+def is_retryable(error):
+    """
+    连接错误、超时和5xx可以重试，其余HTTP错误（4xx）不重试。
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRY_STATUSES
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+class RequestPolicy:
+    """
+    一个接口的请求策略：连接/读取超时，幂等GET请求的有限次重试（指数退避加抖动），
+    以及可选的对冲：请求超过最近的p95延迟仍未返回时再发一个相同的请求，取先成功的那个。
+    """
+    def __init__(self, name, connect = 3.0, read = 10.0, retries = 2, backoff = 0.5, hedge = False):
+        self.name = name
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def p95(self):
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    async def _attempt(self, request):
+        start = time.perf_counter()
+        result = await request(self.timeout)
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, request):
+        delay = self.p95() if self.hedge else None
+        if delay is None:
+            return await self._attempt(request)
+        first = asyncio.ensure_future(self._attempt(request))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=max(delay, HEDGE_MIN_DELAY))
+            if done:
+                return first.result()
+            metrics.inc("bili_http_hedged_total", endpoint=self.name)
+            tasks.add(asyncio.ensure_future(self._attempt(request)))
+            pending = tasks
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # asyncio.wait不会取消它等待的任务，调用方被取消（例如提前停止）时也要取消发出的请求
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self, request):
+        """
+        request(timeout) 发出一次请求并返回结果。可重试的错误按策略重试，重试用完后抛出最后一次的异常；
+        RateLimited和其他异常直接抛出。
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._hedged(request)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries or not is_retryable(e):
+                    raise
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                metrics.inc("bili_http_retries_total", endpoint=self.name)
+                logger.debug("%s 请求失败 (%r)，%.2f 秒后重试", self.name, e, delay)
+                await asyncio.sleep(delay)
+
+POLICIES = {
+    "recommend": RequestPolicy("recommend", connect=3.0, read=10.0),
+    "tags": RequestPolicy("tags", connect=3.0, read=5.0),
+    "passport": RequestPolicy("passport", connect=3.0, read=10.0),
+}
+
+def get_policy(name):
+    return POLICIES[name]
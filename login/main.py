@@ -5,16 +5,28 @@ import os
 import json
 from datetime import datetime, timedelta
 import qrcode
+import qrcode.image.svg
 import io
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import logging
 from urllib.parse import urlparse, parse_qs
 
 # --- 全局变量和配置 ---
-sessions = {}
 
-QR_GEN_API = "http://passport.bilibili.com/x/passport-login/web/qrcode/generate"
-QR_POLL_API = "http://passport.bilibili.com/x/passport-login/web/qrcode/poll"
+from utils import DEFAULT_HEADERS, PASSPORT_BASE_URL, setup_logging
 
-from utils import DEFAULT_HEADERS
+QR_GEN_API = f"{PASSPORT_BASE_URL}/x/passport-login/web/qrcode/generate"
+QR_POLL_API = f"{PASSPORT_BASE_URL}/x/passport-login/web/qrcode/poll"
+from client import get_session, close_session, get_policy
+from accounts import account_cookies_path
+import metrics
+from .session_store import SessionStore
+
+logger = logging.getLogger(__name__)
+
+# 二维码会话，按过期时间自动清理
+sessions = SessionStore()
 
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -25,34 +37,57 @@ DEFAULT_HEADERS = {
 # 定义Cookie存储目录
 COOKIES_DIR = "cookies"
 
+# 应用内共享的ClientSession
+CLIENT_KEY = web.AppKey("client", aiohttp.ClientSession)
+# 所有正在运行的扫码状态轮询任务，应用关闭时取消
+POLL_TASKS_KEY = web.AppKey("poll_tasks", set)
+# 渲染二维码图片的线程池，避免阻塞事件循环
+RENDER_EXECUTOR_KEY = web.AppKey("render_executor", ThreadPoolExecutor)
+# 启动时读取一次的登录页面
+INDEX_HTML_KEY = web.AppKey("index_html", str)
+QR_RENDER_WORKERS = 2
+
+QR_POLL_INTERVAL = 1.0 # 后台轮询B站扫码状态的间隔（秒）
+SSE_KEEPALIVE_INTERVAL = 15.0 # 没有状态变化时SSE保活注释的间隔（秒）
+SUCCESS_DELIVERY_WAIT = 10.0 # 单账号模式下登录成功后等待页面取到结果的最长时间（秒），之后才退出
+CHECK_SCAN_WAIT = 5.0 # /check_scan 等待第一次轮询结果的最长时间（秒），超时按未扫码返回
+
 # --- 辅助函数 ---
 
 async def fetch_json(session, url, params=None, headers=None):
-    """异步GET请求并解析JSON"""
+    """异步GET请求并解析JSON，超时和重试按client.POLICIES["passport"]执行"""
     final_headers = {**DEFAULT_HEADERS, **(headers or {})}
-    async with session.get(url, params=params, headers=final_headers) as response:
-        response.raise_for_status()
-        return await response.json()
+    async def request(timeout):
+        async with session.get(url, params=params, headers=final_headers, timeout=timeout) as response:
+            response.raise_for_status()
+            return await response.json()
+    return await get_policy("passport").run(request)
 
 async def fetch_bytes(session, url, params=None, headers=None):
-    """异步GET请求并返回字节流"""
+    """异步GET请求并返回字节流，超时和重试按client.POLICIES["passport"]执行"""
     final_headers = {**DEFAULT_HEADERS, **(headers or {})}
-    async with session.get(url, params=params, headers=final_headers) as response:
-        response.raise_for_status()
-        return await response.read()
+    async def request(timeout):
+        async with session.get(url, params=params, headers=final_headers, timeout=timeout) as response:
+            response.raise_for_status()
+            return await response.read()
+    return await get_policy("passport").run(request)
     
-def generate_qrcode_image(data_string: str) -> bytes:
+def generate_qrcode_image(data_string: str, image_format: str = 'png') -> bytes:
     """
-    生成包含给定字符串的二维码图片（PNG格式）的字节数据。
+    生成包含给定字符串的二维码图片（PNG或SVG格式）的字节数据。
+    SVG直接输出路径，不经过PIL。
     """
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
         box_size=10,
         border=4,
+        image_factory=qrcode.image.svg.SvgPathImage if image_format == 'svg' else None,
     )
     qr.add_data(data_string)
     qr.make(fit=True)
+    if image_format == 'svg':
+        return qr.make_image().to_string()
     img = qr.make_image(fill_color="black", back_color="white")
     
     # 将图片保存到内存中，并获取字节数据
@@ -60,84 +95,254 @@ def generate_qrcode_image(data_string: str) -> bytes:
     img.save(img_byte_arr, format='PNG')
     return img_byte_arr.getvalue()
 
+def load_index_page():
+    """
+    启动时读取一次登录页面模板，文件不存在时返回None。
+    """
+    template_path = os.path.join(os.path.dirname(__file__), 'templates', 'index.html')
+    try:
+        with open(template_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        logger.warning("HTML template not found: %s", template_path)
+        return None
+
 # --- Aiohttp Web 路由处理函数 ---
 
 async def serve_index_page(request):
     """
     根路径，直接返回主登录页面。
     """
-    current_dir = os.path.dirname(__file__)
-    template_path = os.path.join(current_dir, 'templates', 'index.html')
-    try:
-        with open(template_path, 'r', encoding='utf-8') as f:
-            html_content = f.read()
-        return web.Response(text=html_content, content_type='text/html')
-    except FileNotFoundError:
+    html_content = request.app[INDEX_HTML_KEY]
+    if html_content is None:
         return web.Response(text="<h1>服务器错误: HTML模板文件未找到。</h1>", content_type='text/html', status=500)
+    return web.Response(text=html_content, content_type='text/html')
 
 
 async def generate_qrcode_handler(request):
     """
     处理 /generate_qrcode 请求，生成B站二维码信息。
     """
-    print(f"[{datetime.now()}] Request to /generate_qrcode received.")
-    async with aiohttp.ClientSession() as session:
-        try:
-            qr_gen_data = await fetch_json(session, QR_GEN_API)
-            print(f"[{datetime.now()}] QR Generate API response: {qr_gen_data}")
-
-            if qr_gen_data and qr_gen_data.get('code') == 0 and 'data' in qr_gen_data:
-                qr_data = qr_gen_data['data']
-                qrcode_key = qr_data['qrcode_key']
-                
-                # 存储会话信息
-                sessions[qrcode_key] = {
-                    "qr_data": qr_data,
-                    "expires_time": datetime.now() + timedelta(seconds=qr_data.get('expire_seconds', 60)),
-                    "status": "pending",
-                    "cookie_data": None,
-                    "poll_task": None 
-                }
-                print(f"[{datetime.now()}] QR code generated for key: {qrcode_key}, expires at {sessions[qrcode_key]['expires_time']}")
-                return web.json_response({"qrcode_key": qrcode_key})
-            else:
-                return web.json_response({"message": qr_gen_data.get('message', 'Failed to generate QR code'), "code": qr_gen_data.get('code', -1)}, status=500)
-        except aiohttp.ClientError as e:
-            print(f"[{datetime.now()}] ClientError generating QR code: {e}")
-            return web.json_response({"message": f"Network error generating QR code: {e}"}, status=503)
-        except Exception as e:
-            print(f"[{datetime.now()}] Unexpected error generating QR code: {e}")
-            return web.json_response({"message": f"Server error: {e}"}, status=500)
+    logger.debug("Request to /generate_qrcode received.")
+    session = request.app[CLIENT_KEY]
+    try:
+        qr_gen_data = await fetch_json(session, QR_GEN_API)
+        logger.debug("QR Generate API response: %s", qr_gen_data)
+
+        if qr_gen_data and qr_gen_data.get('code') == 0 and 'data' in qr_gen_data:
+            qr_data = qr_gen_data['data']
+            qrcode_key = qr_data['qrcode_key']
+            
+            # 存储会话信息
+            expire_seconds = qr_data.get('expire_seconds', 60)
+            sessions.add(qrcode_key, {
+                "qr_data": qr_data,
+                "expires_time": datetime.now() + timedelta(seconds=expire_seconds),
+                "status": "pending",
+                "cookie_data": None,
+                "poll_task": None,
+                "last_state": None, # 后台轮询得到的最新 (HTTP状态码, 数据)
+                "subscribers": set(), # 等待状态推送的队列
+                "delivered": asyncio.Event(), # 登录成功的结果已经返回给页面
+                "qr_images": {} # 图片格式 -> 渲染任务，随会话一起释放
+            }, expire_seconds)
+            logger.info("QR code generated for key: %s, expires at %s", qrcode_key, sessions.get(qrcode_key)['expires_time'])
+            return web.json_response({"qrcode_key": qrcode_key})
+        else:
+            return web.json_response({"message": qr_gen_data.get('message', 'Failed to generate QR code'), "code": qr_gen_data.get('code', -1)}, status=500)
+    except aiohttp.ClientError as e:
+        logger.warning("ClientError generating QR code: %s", e)
+        return web.json_response({"message": f"Network error generating QR code: {e}"}, status=503)
+    except Exception as e:
+        logger.error("Unexpected error generating QR code: %s", e)
+        return web.json_response({"message": f"Server error: {e}"}, status=500)
+
+def render_qrcode_image(app, session_info, image_format):
+    """
+    在线程池中渲染二维码，结果按格式缓存在session_info中，同一个key的并发请求共享一次渲染。
+    """
+    task = session_info['qr_images'].get(image_format)
+    if task is None or (task.done() and task.exception() is not None):
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(loop.run_in_executor(
+            app[RENDER_EXECUTOR_KEY], generate_qrcode_image, session_info['qr_data']['url'], image_format))
+        session_info['qr_images'][image_format] = task
+    return task
 
 async def serve_qrcode_image(request):
     """
-    提供二维码图片数据。
+    提供二维码图片数据，format=svg 时返回SVG。
     不再从B站API下载图片，而是我们自己生成二维码图片。
     """
     qrcode_key = request.query.get('qrcode_key')
     if not qrcode_key or qrcode_key not in sessions:
-        print(f"[{datetime.now()}] QR image request with invalid/missing key: {qrcode_key}")
+        logger.warning("QR image request with invalid/missing key: %s", qrcode_key)
         return web.Response(text="无效的二维码会话或已过期", status=400)
     session_info = sessions.get(qrcode_key)
     
     if session_info['expires_time'] < datetime.now():
         sessions.pop(qrcode_key, None)
-        print(f"[{datetime.now()}] QR image request for expired key: {qrcode_key}")
+        logger.info("QR image request for expired key: %s", qrcode_key)
         return web.Response(text="会话已过期", status=404)
+    image_format = 'svg' if request.query.get('format') == 'svg' else 'png'
     # 核心修改：使用 B站提供的 deep link URL 作为二维码的内容
-    bilibili_deep_link_url = session_info['qr_data']['url']
-    print(f"[{datetime.now()}] Generating QR image for deep link URL: {bilibili_deep_link_url} for key: {qrcode_key}")
+    logger.debug("Serving %s QR image for deep link URL: %s for key: %s", image_format, session_info['qr_data']['url'], qrcode_key)
     try:
-        image_bytes = generate_qrcode_image(bilibili_deep_link_url)
-        print(f"[{datetime.now()}] Successfully generated QR image for key: {qrcode_key}")
-        return web.Response(body=image_bytes, content_type='image/png')
+        image_bytes = await render_qrcode_image(request.app, session_info, image_format)
+        content_type = 'image/svg+xml' if image_format == 'svg' else 'image/png'
+        return web.Response(body=image_bytes, content_type=content_type, headers={"Cache-Control": "private, max-age=60"})
     except Exception as e:
-        print(f"[{datetime.now()}] Error generating QR image for {qrcode_key}: {e}")
+        logger.error("Error generating QR image for %s: %s", qrcode_key, e)
         return web.Response(text=f"Server error generating QR image: {e}", status=500)
 
+def extract_cookies(bili_data):
+    """
+    从B站返回的登录成功URL中直接解析出Cookie。
+    """
+    extracted_cookies = {}
+    parsed_url = urlparse(bili_data['url'])
+    query_params = parse_qs(parsed_url.query)
+
+    # 提取SESSDATA, bili_jct, DedeUserID, DedeUserID__ckMd5
+    # 注意：parse_qs 返回的字典，值是列表，需要取第一个元素
+    for name in ('SESSDATA', 'bili_jct', 'DedeUserID', 'DedeUserID__ckMd5'):
+        if name in query_params:
+            extracted_cookies[name] = query_params[name][0]
+
+    # refresh_token也直接从bili_data中获取
+    if 'refresh_token' in bili_data:
+        extracted_cookies['refresh_token'] = bili_data['refresh_token']
+    return extracted_cookies
+
+def save_cookies(extracted_cookies):
+    """
+    保存Cookie到文件：默认文件 + 按DedeUserID区分的账号文件（供轮询的账号池使用）
+    """
+    cookie_file_paths = [os.path.join(COOKIES_DIR, "bilibili_cookies.json")]
+    if extracted_cookies.get('DedeUserID'):
+        cookie_file_paths.append(account_cookies_path(extracted_cookies['DedeUserID'], COOKIES_DIR))
+    for cookie_file_path in cookie_file_paths:
+        try:
+            with open(cookie_file_path, 'w', encoding='utf-8') as f:
+                json.dump(extracted_cookies, f, indent=4, ensure_ascii=False)
+            logger.info("Cookies saved to: %s", cookie_file_path)
+        except Exception as e:
+            logger.error("Failed to save cookies to file: %s", e)
+
+async def poll_qr_status(session, qrcode_key, session_info):
+    """
+    请求一次B站扫码状态接口并更新session_info，返回 (HTTP状态码, 返回给前端的数据)。
+    登录成功时解析并保存Cookie。
+    """
+    logger.debug("Polling QR status for key: %s", qrcode_key)
+    poll_res = await fetch_json(session, QR_POLL_API, params={"qrcode_key": qrcode_key})
+    logger.debug("QR Poll API response for %s: %s", qrcode_key, poll_res)
+    bili_data = poll_res.get('data', {})
+    bili_status_code = bili_data.get('code')
+    bili_status_message = bili_data.get('message', '未知状态')
+    payload = {"code": bili_status_code, "message": bili_status_message, "data": bili_data}
+
+    if bili_status_code == 0: # 成功登录
+        session_info['status'] = 'success'
+        session_info['cookie_data'] = bili_data # B站API返回的data字段，包含url(最终登录url)和refresh_token
+        logger.info("User logged in successfully for key: %s", qrcode_key)
+        extracted_cookies = {}
+        if bili_data.get('url'):
+            extracted_cookies = extract_cookies(bili_data)
+            # 将提取到的cookies存入session_info
+            session_info['final_cookies'] = extracted_cookies
+            logger.debug("Successfully extracted cookies from URL for key %s: %s", qrcode_key, extracted_cookies)
+            save_cookies(extracted_cookies)
+            if extracted_cookies:
+                sessions.notify_success(qrcode_key, session_info)
+        else:
+            logger.warning("Login successful but no redirect URL found for key: %s", qrcode_key)
+        # 返回给前端的数据，包含提取到的cookies
+        payload["data"] = {**bili_data, "extracted_cookies": extracted_cookies}
+    elif bili_status_code == 86090: # 已扫码，待确认
+        session_info['status'] = 'scanned'
+        logger.debug("QR code scanned, waiting for confirmation for key: %s", qrcode_key)
+    elif bili_status_code == 86101: # 未扫码
+        session_info['status'] = 'pending' # 明确设置为pending
+        logger.debug("QR code not scanned yet for key: %s", qrcode_key)
+    elif bili_status_code == 86038: # 二维码已失效或过期
+        session_info['status'] = 'expired'
+        sessions.pop(qrcode_key, None)
+        logger.info("QR code expired for key: %s", qrcode_key)
+    else: # 其他未知状态
+        logger.error("Unexpected QR poll status code %s for key %s: %s", bili_status_code, qrcode_key, bili_status_message)
+        sessions.pop(qrcode_key, None)
+    return 200, payload
+
+def is_final_state(payload):
+    """
+    除了未扫码/已扫码待确认以外的状态都会结束轮询。
+    """
+    return payload.get('code') not in (86101, 86090)
+
+def publish_state(session_info, status, payload):
+    session_info['last_state'] = (status, payload)
+    for queue in session_info['subscribers']:
+        queue.put_nowait((status, payload))
+
+async def qr_poll_loop(session, qrcode_key, session_info):
+    """
+    每个qrcode_key一个后台任务：轮询B站扫码状态，状态变化时推送给所有订阅者，
+    登录成功、二维码失效或过期后结束。
+    """
+    last_code = None
+    while True:
+        if session_info['expires_time'] < datetime.now():
+            sessions.pop(qrcode_key, None)
+            logger.info("QR code expired during poll for key: %s", qrcode_key)
+            publish_state(session_info, 200, {"message": "QR code expired", "code": -1})
+            return
+        try:
+            status, payload = await poll_qr_status(session, qrcode_key, session_info)
+        except aiohttp.ClientError as e:
+            # 网络错误通常是暂时的，稍后重试
+            logger.warning("ClientError polling QR status for %s: %s", qrcode_key, e)
+            await asyncio.sleep(QR_POLL_INTERVAL)
+            continue
+        except Exception as e:
+            logger.error("Unexpected error polling QR status for %s: %s", qrcode_key, e)
+            publish_state(session_info, 500, {"message": f"Server error: {e}", "code": -102})
+            return
+        if payload['code'] != last_code or is_final_state(payload):
+            last_code = payload['code']
+            publish_state(session_info, status, payload)
+        if is_final_state(payload):
+            return
+        await asyncio.sleep(QR_POLL_INTERVAL)
+
+def release_session(qrcode_key, session_info):
+    """
+    会话过期或被淘汰时：通知订阅者、停止轮询任务、丢弃缓存的二维码图片。
+    """
+    if session_info['status'] != 'success':
+        publish_state(session_info, 200, {"message": "QR code expired", "code": -1})
+    task = session_info['poll_task']
+    if task is not None and not task.done():
+        task.cancel()
+    for render_task in session_info['qr_images'].values():
+        render_task.cancel()
+    session_info['qr_images'].clear()
+
+sessions.on_expire = release_session
+
+def ensure_poll_task(app, qrcode_key, session_info):
+    """
+    为qrcode_key启动后台轮询任务（每个key只启动一次）。
+    """
+    if session_info['poll_task'] is None:
+        task = asyncio.create_task(qr_poll_loop(app[CLIENT_KEY], qrcode_key, session_info))
+        session_info['poll_task'] = task
+        app[POLL_TASKS_KEY].add(task)
+        task.add_done_callback(app[POLL_TASKS_KEY].discard)
+
 async def check_scan_status(request):
     """
-    处理 /check_scan 请求，检查B站二维码扫码状态。
+    处理 /check_scan 请求，返回后台轮询任务得到的最新扫码状态，不会每次都请求B站。
     当登录成功时，直接从B站返回的URL中解析出Cookie并保存。
     """
     qrcode_key = request.query.get('qrcode_key')
@@ -148,11 +353,12 @@ async def check_scan_status(request):
         return web.json_response({"message": "QR session expired or not found (maybe already successful)", "code": -1}, status=404)
     if session_info['expires_time'] < datetime.now():
         sessions.pop(qrcode_key, None)
-        print(f"[{datetime.now()}] QR code expired during poll for key: {qrcode_key}")
+        logger.info("QR code expired during poll for key: %s", qrcode_key)
         return web.json_response({"message": "QR code expired", "code": -1})
     # 如果会话已经成功登录，直接返回存储的最终Cookie
     if session_info['status'] == 'success' and session_info.get('final_cookies'):
         # 构造一个符合前端预期的成功响应，包含已获取的cookies
+        session_info['delivered'].set()
         return web.json_response({
             "code": 0, 
             "message": "OK", 
@@ -163,116 +369,95 @@ async def check_scan_status(request):
                 "extracted_cookies": session_info['final_cookies'] # 额外返回提取到的cookies
             }
         })
-    poll_params = {
-        "qrcode_key": qrcode_key
-    }
-    print(f"[{datetime.now()}] Polling QR status for key: {qrcode_key}")
-    async with aiohttp.ClientSession() as session:
+    ensure_poll_task(request.app, qrcode_key, session_info)
+    if session_info['last_state'] is None:
+        # 还没有结果，等待后台任务的第一次轮询
+        queue = asyncio.Queue()
+        session_info['subscribers'].add(queue)
         try:
-            poll_res = await fetch_json(session, QR_POLL_API, params=poll_params)
-            print(f"[{datetime.now()}] QR Poll API response for {qrcode_key}: {poll_res}")
-            bili_data = poll_res.get('data', {})
-            bili_status_code = bili_data.get('code')
-            bili_status_message = bili_data.get('message', '未知状态')
-            
-            # 初始化一个字典用于存储最终提取的Cookie
-            extracted_cookies = {}
-            if bili_status_code == 0: # 成功登录
-                session_info['status'] = 'success'
-                session_info['cookie_data'] = bili_data # B站API返回的data字段，包含url(最终登录url)和refresh_token
-                print(f"[{datetime.now()}] User logged in successfully for key: {qrcode_key}")
-                
-                # ==== 核心修改：从URL中直接解析Cookie START ====
-                redirect_url = bili_data.get('url')
-                if redirect_url:
-                    parsed_url = urlparse(redirect_url)
-                    query_params = parse_qs(parsed_url.query)
-                    
-                    # 提取SESSDATA, bili_jct, DedeUserID, DedeUserID__ckMd5
-                    # 注意：parse_qs 返回的字典，值是列表，需要取第一个元素
-                    if 'SESSDATA' in query_params:
-                        extracted_cookies['SESSDATA'] = query_params['SESSDATA'][0]
-                    if 'bili_jct' in query_params:
-                        extracted_cookies['bili_jct'] = query_params['bili_jct'][0]
-                    if 'DedeUserID' in query_params:
-                        extracted_cookies['DedeUserID'] = query_params['DedeUserID'][0]
-                    if 'DedeUserID__ckMd5' in query_params:
-                        extracted_cookies['DedeUserID__ckMd5'] = query_params['DedeUserID__ckMd5'][0]
-                    
-                    # refresh_token也直接从bili_data中获取
-                    if 'refresh_token' in bili_data:
-                        extracted_cookies['refresh_token'] = bili_data['refresh_token']
-                    
-                    # 将提取到的cookies存入session_info
-                    session_info['final_cookies'] = extracted_cookies
-                    print(f"[{datetime.now()}] Successfully extracted cookies from URL for key {qrcode_key}: {extracted_cookies}")
-                    # 保存Cookie到文件
-                    cookie_file_path = os.path.join(COOKIES_DIR, "bilibili_cookies.json")
-                    try:
-                        with open(cookie_file_path, 'w', encoding='utf-8') as f:
-                            json.dump(extracted_cookies, f, indent=4, ensure_ascii=False)
-                        print(f"[{datetime.now()}] Cookies saved to: {cookie_file_path}")
-                    except Exception as e:
-                        print(f"[{datetime.now()}] Failed to save cookies to file: {e}")
-                else:
-                    print(f"[{datetime.now()}] Login successful but no redirect URL found for key: {qrcode_key}")
-                # ==== 核心修改：从URL中直接解析Cookie END ====
-                # 返回给前端的响应，包含提取到的cookies
-                return web.json_response({
-                    "code": bili_status_code, 
-                    "message": bili_status_message,
-                    "data": {**bili_data, "extracted_cookies": extracted_cookies} # 将提取的cookies添加到data中返回给前端
-                })
-            elif bili_status_code == 86090: # 已扫码，待确认
-                session_info['status'] = 'scanned'
-                print(f"[{datetime.now()}] QR code scanned, waiting for confirmation for key: {qrcode_key}")
-                return web.json_response({
-                    "code": bili_status_code, 
-                    "message": bili_status_message,
-                    "data": bili_data
-                })
-            elif bili_status_code == 86101: # 未扫码
-                session_info['status'] = 'pending' # 明确设置为pending
-                print(f"[{datetime.now()}] QR code not scanned yet for key: {qrcode_key}")
-                return web.json_response({
-                    "code": bili_status_code, 
-                    "message": bili_status_message,
-                    "data": bili_data
-                })
-            elif bili_status_code == 86038: # 二维码已失效或过期
-                session_info['status'] = 'expired'
-                sessions.pop(qrcode_key, None)
-                print(f"[{datetime.now()}] QR code expired for key: {qrcode_key}")
-                return web.json_response({
-                    "code": bili_status_code, 
-                    "message": bili_status_message,
-                    "data": bili_data
-                })
-            else: # 其他未知状态
-                print(f"[{datetime.now()}] Unexpected QR poll status code {bili_status_code} for key {qrcode_key}: {bili_status_message}")
-                sessions.pop(qrcode_key, None) 
-                return web.json_response({
-                    "code": bili_status_code, 
-                    "message": bili_status_message,
-                    "data": bili_data
-                })
-        except aiohttp.ClientError as e:
-            print(f"[{datetime.now()}] ClientError polling QR status for {qrcode_key}: {e}")
-            return web.json_response({"message": f"Network error polling QR status: {e}", "code": -101}, status=503)
-        except Exception as e:
-            print(f"[{datetime.now()}] Unexpected error polling QR status for {qrcode_key}: {e}")
-            return web.json_response({"message": f"Server error: {e}", "code": -102}, status=500)
+            await asyncio.wait_for(queue.get(), CHECK_SCAN_WAIT)
+        except asyncio.TimeoutError:
+            # B站接口一直出错时后台任务会持续重试，不让请求一直挂着
+            return web.json_response({"message": "Waiting for QR status", "code": 86101})
+        finally:
+            session_info['subscribers'].discard(queue)
+    status, payload = session_info['last_state']
+    if payload.get('code') == 0:
+        session_info['delivered'].set()
+    return web.json_response(payload, status=status)
+
+async def scan_events_handler(request):
+    """
+    处理 /scan_events 请求，以Server-Sent Events推送扫码状态变化。
+    同一个qrcode_key的所有页面共享一个后台轮询任务。
+    """
+    qrcode_key = request.query.get('qrcode_key')
+    session_info = sessions.get(qrcode_key) if qrcode_key else None
+    if not session_info:
+        return web.json_response({"message": "QR session expired or not found (maybe already successful)", "code": -1}, status=404)
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    queue = asyncio.Queue()
+    session_info['subscribers'].add(queue)
+    ensure_poll_task(request.app, qrcode_key, session_info)
+    try:
+        if session_info['last_state'] is not None:
+            queue.put_nowait(session_info['last_state'])
+        while True:
+            try:
+                status, payload = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                await response.write(b": keepalive\n\n")
+                continue
+            data = json.dumps({**payload, "http_status": status}, ensure_ascii=False)
+            await response.write(f"data: {data}\n\n".encode('utf-8'))
+            if payload.get('code') == 0:
+                session_info['delivered'].set()
+            if is_final_state(payload):
+                break
+    except ConnectionResetError:
+        logger.debug("Event stream closed by client for key: %s", qrcode_key)
+    finally:
+        session_info['subscribers'].discard(queue)
+    return response
 
 # --- Aiohttp 应用启动和命令行接口 ---
-async def start_web_server():
+async def client_context(app):
+    """
+    应用生命周期内复用同一个ClientSession和渲染线程池，并运行会话过期清理任务；
+    关闭时取消扫码轮询任务并释放资源。
+    """
+    app[CLIENT_KEY] = get_session()
+    app[POLL_TASKS_KEY] = set()
+    app[RENDER_EXECUTOR_KEY] = ThreadPoolExecutor(max_workers=QR_RENDER_WORKERS, thread_name_prefix="qrcode")
+    sessions.start()
+    yield
+    await sessions.stop()
+    for task in list(app[POLL_TASKS_KEY]):
+        task.cancel()
+    await asyncio.gather(*app[POLL_TASKS_KEY], return_exceptions=True)
+    app[RENDER_EXECUTOR_KEY].shutdown(wait=False, cancel_futures=True)
+    await close_session()
+
+def create_app():
     app = web.Application()
+    app[INDEX_HTML_KEY] = load_index_page()
+    app.cleanup_ctx.append(client_context)
     app.router.add_get('/', serve_index_page)
     app.router.add_get('/generate_qrcode', generate_qrcode_handler)
     app.router.add_get('/qrcode_image', serve_qrcode_image)
     app.router.add_get('/check_scan', check_scan_status)
+    app.router.add_get('/scan_events', scan_events_handler)
+    app.router.add_get('/metrics', metrics.metrics_handler)
     # 移除 finish_login 路由
     # app.router.add_post('/finish_login', finish_login_handler) 
-    runner = web.AppRunner(app)
+    return app
+
+async def start_web_server(multi=False):
+    """
+    multi为True时登录成功后不退出，可以继续登录其他账号。
+    """
+    runner = web.AppRunner(create_app())
     await runner.setup()
     site = web.TCPSite(runner, 'localhost', 8080)
     await site.start()
@@ -282,32 +467,36 @@ async def start_web_server():
     print("http://localhost:8080")
     print("等待登录成功...")
     print(f"登录成功后，Cookie将保存到 '{COOKIES_DIR}/bilibili_cookies.json'")
+    print(f"并按账号另存为 '{COOKIES_DIR}/bilibili_cookies_<DedeUserID>.json'")
     print("-------------------------------------------------------")
     try:
         while True:
-            await asyncio.sleep(1)
-            
-            successful_session = None
-            for qrcode_key, info in list(sessions.items()): 
-                if info['status'] == 'success' and 'final_cookies' in info and info['final_cookies']:
-                    successful_session = info
-                    sessions.pop(qrcode_key, None) 
-                    break 
+            # 等待登录成功的通知，而不是每秒扫描所有会话
+            # 成功的会话保留到过期，页面之后的 /check_scan 仍能取到登录成功的结果
+            qrcode_key, successful_session = await sessions.wait_for_success()
+            print("\n")
+            print("-------------------------------------------------------")
+            print("登录成功！")
+            print("获取到的完整Cookie:")
+            final_cookies = successful_session['final_cookies']
+            for k, v in final_cookies.items():
+                print(f"  {k}: {v}")
             
-            if successful_session:
-                print("\n")
-                print("-------------------------------------------------------")
-                print("登录成功！")
-                print("获取到的完整Cookie:")
-                final_cookies = successful_session['final_cookies']
-                for k, v in final_cookies.items():
-                    print(f"  {k}: {v}")
-                
-                cookie_file_path = os.path.join(COOKIES_DIR, "bilibili_cookies.json")
-                print(f"\nCookie已保存到文件: {cookie_file_path}")
-                print("您现在可以基于这些登录信息进行后续B站操作了。")
-                print("-------------------------------------------------------")
-                break 
+            cookie_file_path = os.path.join(COOKIES_DIR, "bilibili_cookies.json")
+            print(f"\nCookie已保存到文件: {cookie_file_path}")
+            if final_cookies.get('DedeUserID'):
+                print(f"账号文件: {account_cookies_path(final_cookies['DedeUserID'], COOKIES_DIR)}")
+            print("您现在可以基于这些登录信息进行后续B站操作了。")
+            print("-------------------------------------------------------")
+            if multi:
+                print("继续等待其他账号登录...")
+                continue
+            # 等页面取到登录成功的结果再退出，否则它下一次 /check_scan 会连接失败
+            try:
+                await asyncio.wait_for(successful_session['delivered'].wait(), SUCCESS_DELIVERY_WAIT)
+            except asyncio.TimeoutError:
+                pass
+            break 
             
     except asyncio.CancelledError:
         print("\n服务器已停止.")
@@ -317,7 +506,11 @@ async def start_web_server():
         await runner.cleanup()
 # --- 主入口 ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="B站扫码登录")
+    parser.add_argument('--multi', action='store_true', help="登录成功后继续运行，用于登录多个账号")
+    args = parser.parse_args()
+    setup_logging()
     try:
-        asyncio.run(start_web_server())
+        asyncio.run(start_web_server(args.multi))
     except KeyboardInterrupt:
         print("\n程序被用户中断，退出。")
@@ -0,0 +1,116 @@
+import asyncio
+import heapq
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- 配置常量 ---
+MAX_SESSIONS = 1000 # 同时保存的二维码会话上限，超出时淘汰最早过期的
+
+class SessionStore:
+    """
+    二维码会话存储：按过期时间维护一个最小堆，由后台任务在到期时删除，
+    删除复杂度O(log n)；超过容量时淘汰最早过期的会话。
+    登录成功的会话通过notify_success放入队列，wait_for_success等待而不是轮询扫描。
+    """
+    def __init__(self, capacity = MAX_SESSIONS, on_expire = None):
+        self.capacity = capacity
+        self.on_expire = on_expire # 会话因过期或容量被删除时调用 on_expire(key, info)
+        self.items = {}
+        self.deadlines = {} # key -> 过期时刻（time.monotonic）
+        self.heap = []      # (过期时刻, key)，删除/覆盖的条目在弹出时跳过
+        self.successes = asyncio.Queue()
+        self.wakeup = asyncio.Event()
+        self.sweeper = None
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default = None):
+        deadline = self.deadlines.get(key)
+        if deadline is None:
+            return default
+        if deadline <= time.monotonic():
+            self._expire(key)
+            return default
+        return self.items[key]
+
+    def add(self, key, info, ttl):
+        """
+        保存会话，ttl秒后过期。
+        """
+        while len(self.items) >= self.capacity and key not in self.items:
+            self._expire_earliest()
+        deadline = time.monotonic() + ttl
+        self.items[key] = info
+        self.deadlines[key] = deadline
+        heapq.heappush(self.heap, (deadline, key))
+        if self.heap[0] == (deadline, key):
+            # 新会话比之前的都早过期，唤醒清理任务重新计算等待时间
+            self.wakeup.set()
+
+    def pop(self, key, default = None):
+        self.deadlines.pop(key, None)
+        return self.items.pop(key, default)
+
+    def notify_success(self, key, info):
+        self.successes.put_nowait((key, info))
+
+    async def wait_for_success(self):
+        """
+        等待下一个登录成功的会话，返回 (key, info)。
+        """
+        return await self.successes.get()
+
+    def _expire(self, key):
+        info = self.pop(key)
+        if info is not None and self.on_expire is not None:
+            self.on_expire(key, info)
+
+    def _expire_earliest(self):
+        while self.heap:
+            deadline, key = heapq.heappop(self.heap)
+            if self.deadlines.get(key) == deadline:
+                logger.warning("Session store full, evicting key: %s", key)
+                self._expire(key)
+                return
+
+    def sweep(self):
+        """
+        删除所有已过期的会话，返回距离下一个会话过期的秒数（没有会话时返回None）。
+        """
+        now = time.monotonic()
+        while self.heap:
+            deadline, key = self.heap[0]
+            if self.deadlines.get(key) != deadline:
+                heapq.heappop(self.heap)
+                continue
+            if deadline > now:
+                return deadline - now
+            heapq.heappop(self.heap)
+            logger.info("Session expired: %s", key)
+            self._expire(key)
+        return None
+
+    async def _sweep_loop(self):
+        while True:
+            delay = self.sweep()
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self.sweeper is None:
+            self.sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+            await asyncio.gather(self.sweeper, return_exceptions=True)
+            self.sweeper = None
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from contextlib import contextmanager
+import aiohttp
+from aiohttp import web
+
+# 延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+HELP = {
+    "bili_http_requests_total": "按接口和HTTP状态码统计的上游请求数",
+    "bili_http_request_seconds": "按接口统计的上游请求延迟",
+    "bili_http_errors_total": "按接口和异常类型统计的网络错误数",
+    "bili_http_cancelled_total": "按接口统计被取消的请求数（提前停止、对冲请求）",
+    "bili_api_errors_total": "按接口和B站业务错误码统计的错误数",
+    "bili_http_retries_total": "按接口统计的重试次数",
+    "bili_http_hedged_total": "按接口统计发出的对冲请求数",
+    "bili_stage_seconds": "按流水线阶段统计的耗时",
+    "bili_tag_cache_total": "tag缓存查询结果",
+    "bili_videos_total": "按结果统计的视频数",
+    "bili_tag_calls_avoided_total": "按原因统计省下的tag请求数",
+}
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+_counters = {}   # (name, labels) -> 数值
+_histograms = {} # (name, labels) -> Histogram
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+def get(name, **labels):
+    """
+    返回计数器当前的值。
+    """
+    return _counters.get(_key(name, labels), 0)
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram()
+    histogram.observe(value)
+
+@contextmanager
+def timed(stage):
+    """
+    记录一个流水线阶段（fetch、tag、decode、match、sink等）的耗时。
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("bili_stage_seconds", time.perf_counter() - start, stage=stage)
+
+def reset():
+    _counters.clear()
+    _histograms.clear()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def render():
+    """
+    以Prometheus文本格式导出所有指标。
+    """
+    lines = []
+    for name in sorted({name for name, _ in _counters}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for (key_name, labels), value in sorted(_counters.items()):
+            if key_name == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+    for name in sorted({name for name, _ in _histograms}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+        for (key_name, labels), histogram in sorted(_histograms.items(), key=lambda kv: kv[0]):
+            if key_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+def summary():
+    """
+    运行结束时打印的可读汇总。
+    """
+    lines = ["----------------------- 运行统计 -----------------------"]
+    for (name, labels), value in sorted(_counters.items()):
+        lines.append(f"{name}{_format_labels(labels)}: {value}")
+    for (name, labels), histogram in sorted(_histograms.items(), key=lambda kv: kv[0]):
+        mean = histogram.total / histogram.count if histogram.count else 0.0
+        lines.append(f"{name}{_format_labels(labels)}: n={histogram.count}, "
+                     f"平均 {mean * 1000:.1f} ms, 最大 {histogram.max * 1000:.1f} ms")
+    lines.append("-------------------------------------------------------")
+    return "\n".join(lines)
+
+async def metrics_handler(request):
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+# --- aiohttp请求追踪：每个上游接口的延迟和状态码 ---
+
+async def _on_request_start(session, context, params):
+    context.start = time.perf_counter()
+
+async def _on_request_end(session, context, params):
+    endpoint = params.url.path
+    observe("bili_http_request_seconds", time.perf_counter() - context.start, endpoint=endpoint)
+    inc("bili_http_requests_total", endpoint=endpoint, status=params.response.status)
+
+async def _on_request_exception(session, context, params):
+    # 提前停止或对冲取消的请求不是网络错误
+    if isinstance(params.exception, asyncio.CancelledError):
+        inc("bili_http_cancelled_total", endpoint=params.url.path)
+        return
+    inc("bili_http_errors_total", endpoint=params.url.path, error=type(params.exception).__name__)
+
+def trace_config():
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(_on_request_start)
+    config.on_request_end.append(_on_request_end)
+    config.on_request_exception.append(_on_request_exception)
+    return config
@@ -0,0 +1,151 @@
+import glob
+import gzip
+import json
+import os
+import time
+import zlib
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# --- 配置常量 ---
+ARCHIVE_DIR = "api_responses" # 原始API响应的归档目录
+BLOCK_BYTES = 256 * 1024      # 未压缩数据攒够这么多就压缩成一个块写入
+SEGMENT_BYTES = 64 * 1024 * 1024 # 单个分段文件（压缩后）超过这个大小就换新文件
+
+def default_codec():
+    return "zstd" if zstandard is not None else "gzip"
+
+def compress(codec, data):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data)
+
+def decompress(codec, data):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("读取zstd归档需要安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data, wbits=31)
+
+class ArchiveWriter:
+    """
+    把API响应以紧凑JSON逐行追加到压缩分段文件。
+    每攒够BLOCK_BYTES压缩成一个独立的gzip成员/zstd帧，整个文件仍可以顺序解压；
+    同名的 .idx 文件记录每个块的偏移、长度以及块内记录的 (类型, key)，读取单条记录只需解压一个块。
+    """
+    def __init__(self, directory = ARCHIVE_DIR, codec = None, block_bytes = BLOCK_BYTES, segment_bytes = SEGMENT_BYTES):
+        self.directory = directory
+        self.codec = codec or default_codec()
+        self.block_bytes = block_bytes
+        self.segment_bytes = segment_bytes
+        self.segment = None
+        self.index = None
+        self.segment_size = 0
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.keys = []
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_segment(self):
+        name = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        extension = "zst" if self.codec == "zstd" else "gz"
+        # 带上进程号，多个轮询进程同时写归档时文件名不会冲突
+        path = os.path.join(self.directory, f"segment_{name}_{os.getpid()}.jsonl.{extension}")
+        self.segment = open(path, 'ab')
+        self.index = open(path + ".idx", 'a', encoding='utf-8')
+        self.segment_size = 0
+
+    def write(self, kind, key, data):
+        """
+        追加一条记录，kind为 "recommend" 或 "tags"，key为fresh_idx或bvid。
+        """
+        record = {"t": time.time(), "kind": kind, "key": key, "data": data}
+        self._append(kind, key, json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+
+    def write_raw(self, kind, key, raw):
+        """
+        追加一条记录，raw为接口返回的原始JSON字节，直接拼接进记录而不重新编码。
+        """
+        raw = raw.strip()
+        if b'\n' in raw:
+            # 归档按行分隔记录，带换行的响应只能解码后重新编码
+            self.write(kind, key, json.loads(raw))
+            return
+        head = {"t": time.time(), "kind": kind, "key": key}
+        self._append(kind, key, json.dumps(head, ensure_ascii=False, separators=(',', ':')).encode('utf-8')[:-1] + b',"data":' + raw + b'}\n')
+
+    def _append(self, kind, key, line):
+        self.buffer.append(line)
+        self.buffer_bytes += len(line)
+        self.keys.append([kind, key])
+        if self.buffer_bytes >= self.block_bytes:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.segment is None or self.segment_size >= self.segment_bytes:
+            self.close_segment()
+            self._open_segment()
+        block = compress(self.codec, b''.join(self.buffer))
+        offset = self.segment.tell()
+        self.segment.write(block)
+        self.segment.flush()
+        entry = {"offset": offset, "length": len(block), "records": self.keys}
+        self.index.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.index.flush()
+        self.segment_size = offset + len(block)
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.keys = []
+
+    def close_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.index.close()
+            self.segment = None
+            self.index = None
+
+    def close(self):
+        self.flush()
+        self.close_segment()
+
+def segment_codec(path):
+    return "zstd" if path.endswith(".zst") else "gzip"
+
+def list_segments(directory = ARCHIVE_DIR):
+    segments = glob.glob(os.path.join(directory, "segment_*.jsonl.gz"))
+    segments += glob.glob(os.path.join(directory, "segment_*.jsonl.zst"))
+    return sorted(segments)
+
+def read_index(path):
+    with open(path + ".idx", 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def read_block(path, entry):
+    with open(path, 'rb') as f:
+        f.seek(entry["offset"])
+        data = decompress(segment_codec(path), f.read(entry["length"]))
+    return [json.loads(line) for line in data.splitlines()]
+
+def iter_records(path):
+    """
+    顺序读出一个分段文件中的所有记录。
+    """
+    for entry in read_index(path):
+        yield from read_block(path, entry)
+
+def find_record(path, kind, key):
+    """
+    借助索引找到一条记录，只解压它所在的块；找不到返回None。
+    """
+    for entry in read_index(path):
+        if [kind, key] in entry["records"]:
+            for record in read_block(path, entry):
+                if record["kind"] == kind and record["key"] == key:
+                    return record
+    return None
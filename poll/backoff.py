@@ -0,0 +1,53 @@
+"""
+多进程轮询时共享的限流状态：整体退避和被暂停的账号保存在与SharedSeenSet相同的SQLite文件里，
+一个worker被限流后所有worker一起退避，不会换个进程继续用同一份Cookie请求。
+时间用 time.time()，各进程可以直接比较。
+"""
+import os
+import sqlite3
+import time
+from .seen import SHARED_SEEN_DB_PATH, SQLITE_TIMEOUT
+
+class SharedBackoff:
+    """
+    name -> (blocked_until, level)：AdaptivePacer使用 "pacer"，AccountPool每个账号使用 "account:<文件名>"。
+    """
+    def __init__(self, path = SHARED_SEEN_DB_PATH, timeout = SQLITE_TIMEOUT):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS backoff ("
+            "name TEXT PRIMARY KEY, blocked_until REAL NOT NULL, level INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID"
+        )
+
+    def get(self, name):
+        """
+        返回 (blocked_until, level)，没有记录时为 (0.0, 0)。
+        """
+        row = self.db.execute("SELECT blocked_until, level FROM backoff WHERE name = ?", (name,)).fetchone()
+        return row if row is not None else (0.0, 0)
+
+    def blocked(self, prefix):
+        """
+        返回名字以prefix开头、仍在暂停中的条目：name -> blocked_until。
+        """
+        rows = self.db.execute("SELECT name, blocked_until FROM backoff WHERE name LIKE ? AND blocked_until > ?",
+                               (prefix + '%', time.time()))
+        return dict(rows)
+
+    def set(self, name, blocked_until, level = 0):
+        self.db.execute(
+            "INSERT INTO backoff (name, blocked_until, level) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until), level = excluded.level",
+            (name, blocked_until, level)
+        )
+
+    def clear(self):
+        self.db.execute("DELETE FROM backoff")
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,114 @@
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+import logging
+import metrics
+from .records import parse_tags, dump_tags
+
+logger = logging.getLogger(__name__)
+
+# --- 配置常量 ---
+CACHE_DB_PATH = "cache/tags.sqlite3"  # 磁盘缓存文件
+CACHE_MAX_ENTRIES = 4096              # 内存LRU最多保存的条目数
+CACHE_TTL = 7 * 24 * 3600             # 缓存有效期（秒），视频tag很少变化
+CACHE_PURGE_INTERVAL = 1000          # 每写入这么多条清理一次磁盘上过期的条目
+
+class TagCache:
+    """
+    bvid -> tags 的两级缓存：内存LRU + SQLite磁盘存储（带TTL）。
+    磁盘上每个视频保存 [[tag_id, tag_name], ...]，读出时转换成records.Tag。
+    """
+    def __init__(self, path=CACHE_DB_PATH, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory = OrderedDict()  # bvid -> (写入时间, tags)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.puts = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # WAL模式下多个轮询进程可以共用同一个缓存文件
+        self.db = sqlite3.connect(path, timeout=30.0)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS tags ("
+            "bvid TEXT PRIMARY KEY, fetched_at REAL NOT NULL, tags TEXT NOT NULL)"
+        )
+        self.db.commit()
+        self.purge_expired()
+
+    def _remember(self, bvid, fetched_at, tags):
+        self.memory[bvid] = (fetched_at, tags)
+        self.memory.move_to_end(bvid)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, bvid):
+        """
+        返回缓存的tags，未命中或已过期时返回None。
+        """
+        now = time.time()
+        entry = self.memory.get(bvid)
+        if entry is not None:
+            if now - entry[0] < self.ttl:
+                self.memory.move_to_end(bvid)
+                self.memory_hits += 1
+                metrics.inc("bili_tag_cache_total", result="memory_hit")
+                return entry[1]
+            del self.memory[bvid]
+        row = self.db.execute(
+            "SELECT fetched_at, tags FROM tags WHERE bvid = ? AND fetched_at > ?",
+            (bvid, now - self.ttl)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            metrics.inc("bili_tag_cache_total", result="miss")
+            return None
+        tags = parse_tags(json.loads(row[1]))
+        self._remember(bvid, row[0], tags)
+        self.disk_hits += 1
+        metrics.inc("bili_tag_cache_total", result="disk_hit")
+        return tags
+
+    def put(self, bvid, tags):
+        now = time.time()
+        self._remember(bvid, now, tags)
+        self.db.execute(
+            "INSERT OR REPLACE INTO tags (bvid, fetched_at, tags) VALUES (?, ?, ?)",
+            (bvid, now, json.dumps(dump_tags(tags), ensure_ascii=False, separators=(',', ':')))
+        )
+        self.db.commit()
+        self.puts += 1
+        if self.puts % CACHE_PURGE_INTERVAL == 0:
+            self.purge_expired()
+
+    def purge_expired(self):
+        """
+        删除磁盘上已过期的条目，打开时和每写入 CACHE_PURGE_INTERVAL 条时调用一次。
+        """
+        deleted = self.db.execute("DELETE FROM tags WHERE fetched_at <= ?", (time.time() - self.ttl,)).rowcount
+        self.db.commit()
+        if deleted:
+            logger.debug("已清理 %s 条过期的tag缓存", deleted)
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+    def report(self):
+        stats = self.stats()
+        logger.info("tag缓存: 内存命中 %s, 磁盘命中 %s, 未命中 %s, 命中率 %.1f%%",
+                    stats['memory_hits'], stats['disk_hits'], stats['misses'], stats['hit_rate'] * 100)
+
+    def close(self):
+        self.db.close()
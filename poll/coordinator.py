@@ -0,0 +1,139 @@
+"""
+多进程轮询：启动N个worker进程，每个进程有自己的事件循环和ClientSession，分别请求不同的推荐页。
+已检查的视频通过SQLite（WAL模式）共享，同一个视频只会被一个worker检查；
+结果由各worker写入同一个结果数据库（poll/results_db.py），全部结束后再统一导出到 results.txt（以及 --jsonl）。
+
+用法: python -m poll.coordinator --workers 2 [与 poll.poll_videos 相同的参数]
+"""
+import asyncio
+import logging
+import multiprocessing
+import signal
+from datetime import datetime
+from utils import setup_logging
+from client import get_policy
+from . import poll_videos
+from .seen import SeenSet, SharedSeenSet, SEEN_FILE_PATH, SHARED_SEEN_DB_PATH
+from .backoff import SharedBackoff
+from .sinks import TextSink, JsonlSink
+from .results_db import ResultStore, RESULTS_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# 所有worker共用同一批账号的Cookie，进程多了只会更快触发限流
+DEFAULT_WORKERS = 2
+MAX_WORKERS = 4
+
+def split_limit(limit, count):
+    """
+    把总的上限平均分给count个worker（向上取整），None表示不限。
+    """
+    return None if limit is None else -(-limit // count)
+
+def run_worker(index, count, options):
+    """
+    worker进程入口。
+    """
+    setup_logging()
+    get_policy("tags").hedge = options["hedge"]
+    seen = SharedSeenSet(options["seen_db"])
+    backoff = SharedBackoff(options["seen_db"])
+    metrics_port = options["metrics_port"] + index if options["metrics_port"] else None
+    try:
+        asyncio.run(poll_videos.main(options["max_videos"], options["max_polls"], options["persist_seen"], [],
+                                     options["daemon"], options["feeds"], metrics_port, options["archive"],
+                                     options["prefilter"], shard=(index, count), seen=seen, db_path=options["results_db"],
+                                     concurrency=options["concurrency"], backoff=backoff))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        seen.close()
+        backoff.close()
+
+def main(workers, max_videos = 10, max_polls = 10, persist_seen = False, daemon = False, feeds = poll_videos.FEEDS_PER_POLL,
+         metrics_port = None, archive = False, prefilter = True, hedge = False, results_db = RESULTS_DB_PATH, jsonl = None,
+         concurrency = poll_videos.TAG_CONCURRENCY):
+    """
+    启动workers个进程轮询，max_videos和max_polls平均分给各个worker。
+    metrics_port不为空时第i个worker在 metrics_port+i 端口提供 /metrics。
+    worker数最多为 MAX_WORKERS；限流退避和账号暂停通过SharedBackoff在worker之间共享。
+    concurrency为每个worker同时进行的tag请求上限。
+    """
+    if workers > MAX_WORKERS:
+        logger.warning("worker数 %s 超过上限，使用 %s 个", workers, MAX_WORKERS)
+        workers = MAX_WORKERS
+    seen = SharedSeenSet(SHARED_SEEN_DB_PATH)
+    seen.clear()
+    backoff = SharedBackoff(SHARED_SEEN_DB_PATH)
+    backoff.clear()
+    backoff.close()
+    if persist_seen:
+        seen.load(SeenSet(SEEN_FILE_PATH))
+    # 先建好结果表和索引并切换到WAL模式，避免worker同时建表
+    store = ResultStore(results_db)
+    since = datetime.now().isoformat()
+    options = {
+        "max_videos": split_limit(max_videos, workers),
+        "max_polls": split_limit(max_polls, workers),
+        "persist_seen": persist_seen,
+        "daemon": daemon,
+        "feeds": feeds,
+        "metrics_port": metrics_port,
+        "archive": archive,
+        "prefilter": prefilter,
+        "hedge": hedge,
+        "seen_db": SHARED_SEEN_DB_PATH,
+        "results_db": results_db,
+        "concurrency": concurrency,
+    }
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_worker, args=(i, workers, options), name=f"poll-worker-{i}")
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    logger.info("已启动 %s 个worker进程", workers)
+
+    def terminate(signum, frame):
+        # 把SIGTERM转发给worker，它们各自保存后退出，之后照常导出结果
+        logger.info("收到SIGTERM，正在停止worker")
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Ctrl-C 同时发给了所有worker，等它们保存完再导出
+        for process in processes:
+            process.join()
+    finally:
+        # persist_seen时导出数据库中的所有结果，与单进程时一致；JSONL中保留每个视频的发现时间
+        sinks = [TextSink('results.txt')]
+        try:
+            if jsonl:
+                sinks.append(JsonlSink(jsonl))
+            found = store.export(sinks, None if persist_seen else since)
+        finally:
+            for sink in sinks:
+                sink.close()
+            store.close()
+        if persist_seen:
+            stored = SeenSet(SEEN_FILE_PATH)
+            seen.dump(stored)
+            stored.save()
+        logger.info("导出 %s 个视频，已检查 %s 个，结果见 results.txt 和 %s", found, len(seen), results_db)
+        seen.close()
+
+if __name__ == "__main__":
+    parser = poll_videos.build_parser("多进程轮询B站推荐列表，按tag筛选视频")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"worker进程数（默认{DEFAULT_WORKERS}，最多{MAX_WORKERS}），所有worker共用同一批账号")
+    args = parser.parse_args()
+    setup_logging()
+    max_videos, max_polls = poll_videos.resolve_limits(args)
+    try:
+        main(max(1, args.workers), max_videos, max_polls, args.persist_seen, args.daemon, args.feeds, args.metrics_port,
+             args.archive, not args.no_prefilter, args.hedge, args.sqlite, args.jsonl, max(1, args.concurrency))
+    except KeyboardInterrupt:
+        print("\n程序被用户中断，已保存的结果见 results.txt。")
@@ -0,0 +1,89 @@
+import re
+import unicodedata
+from utils import TAG_SET, TITLE_ACCEPT_SET
+
+# 标题预筛选忽略过短的关键词（如“灯”“要”），它们在标题里太常见
+TITLE_MIN_KEYWORD_LEN = 2
+
+def normalize(text):
+    """
+    统一大小写与全角/半角：NFKC把全角字母数字转成半角，casefold处理大小写。
+    """
+    return unicodedata.normalize('NFKC', text).casefold()
+
+class TagMatcher:
+    """
+    把关键词集合编译成一个正则交替式，每个tag名只扫描一次。
+    whole_words为True时英文关键词只匹配完整单词，用于标题这种长文本。
+    """
+    def __init__(self, keywords, whole_words=False):
+        # 归一化后的关键词 -> 原始关键词，用于报告命中了哪个关键词
+        self.keywords = {}
+        for keyword in keywords:
+            self.keywords.setdefault(normalize(keyword), keyword)
+        # 长的关键词优先，保证报告的是最具体的匹配
+        alternatives = sorted(self.keywords, key=len, reverse=True)
+        if whole_words:
+            alternatives = [f'(?<![a-z0-9]){re.escape(k)}(?![a-z0-9])' if k.isascii() else re.escape(k) for k in alternatives]
+        else:
+            alternatives = [re.escape(k) for k in alternatives]
+        self.pattern = re.compile('|'.join(alternatives)) if alternatives else None
+
+    def match(self, text):
+        """
+        返回text中命中的关键词（原始写法），未命中返回None。
+        """
+        if self.pattern is None or not text:
+            return None
+        found = self.pattern.search(normalize(text))
+        return self.keywords[found.group()] if found else None
+
+    def match_tags(self, tags):
+        """
+        依次检查tag列表（records.Tag）中的tag_name，返回第一个命中的关键词。
+        """
+        for tag in tags:
+            keyword = self.match(tag.tag_name)
+            if keyword is not None:
+                return keyword
+        return None
+
+    def match_item(self, item):
+        """
+        检查视频标题和UP主名字，返回命中的关键词。
+        """
+        return self.match(item.title) or self.match(item.owner_name)
+
+def title_matcher(keywords):
+    return TagMatcher([k for k in keywords if len(normalize(k)) >= TITLE_MIN_KEYWORD_LEN], whole_words=True)
+
+def accept_matcher(keywords):
+    """
+    keywords中属于 TITLE_ACCEPT_SET 的关键词，标题命中它们的视频直接算作结果。
+    """
+    accepted = {normalize(k) for k in TITLE_ACCEPT_SET}
+    return TagMatcher([k for k in keywords if normalize(k) in accepted], whole_words=True)
+
+_matcher = TagMatcher(TAG_SET)
+_title_matcher = title_matcher(TAG_SET)
+_accept_matcher = accept_matcher(TAG_SET)
+
+def get_matcher():
+    return _matcher
+
+def get_title_matcher():
+    return _title_matcher
+
+def get_accept_matcher():
+    return _accept_matcher
+
+def reload_matcher(keywords=None):
+    """
+    关键词配置变化后重新编译匹配器。
+    """
+    global _matcher, _title_matcher, _accept_matcher
+    keywords = TAG_SET if keywords is None else keywords
+    _matcher = TagMatcher(keywords)
+    _title_matcher = title_matcher(keywords)
+    _accept_matcher = accept_matcher(keywords)
+    return _matcher
@@ -0,0 +1,52 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# --- 配置常量 ---
+OWNER_STATS_PATH = "cache/owner_stats.json" # 每个UP主的命中统计
+PRIOR_HITS = 1.0    # 平滑用的先验：没见过的UP主按 PRIOR_HITS / PRIOR_CHECKS 的命中率计
+PRIOR_CHECKS = 10.0
+
+class OwnerStats:
+    """
+    按UP主（owner mid）统计检查过的视频数和命中数，用于决定先查哪些视频的tag。
+    指定path时从JSON文件加载，并可以保存回去。
+    """
+    def __init__(self, path = None):
+        self.path = path
+        self.stats = {} # mid -> [命中数, 检查数]
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.stats = {int(mid): counts for mid, counts in json.load(f).items()}
+            logger.info("已加载 %s 个UP主的命中统计: %s", len(self.stats), path)
+
+    def __len__(self):
+        return len(self.stats)
+
+    def record(self, mid, hit):
+        if mid is None:
+            return
+        counts = self.stats.get(mid)
+        if counts is None:
+            counts = self.stats[mid] = [0, 0]
+        counts[0] += 1 if hit else 0
+        counts[1] += 1
+
+    def score(self, mid):
+        """
+        平滑后的命中率，越高越先检查。
+        """
+        hits, checks = self.stats.get(mid, (0, 0))
+        return (hits + PRIOR_HITS) / (checks + PRIOR_CHECKS)
+
+    def save(self):
+        if not self.path:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.stats, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
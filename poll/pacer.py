@@ -0,0 +1,93 @@
+import asyncio
+import random
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- 配置常量 ---
+MIN_INTERVAL = 2.0        # 两次推荐请求之间的最短间隔（秒）
+MAX_INTERVAL = 60.0       # 最长间隔（秒）
+INITIAL_INTERVAL = 5.0
+SPEEDUP_FACTOR = 0.75     # 新视频多时缩短间隔
+SLOWDOWN_FACTOR = 1.5     # 大多是重复视频时拉长间隔
+HIGH_FRESH_RATIO = 0.5
+LOW_FRESH_RATIO = 0.2
+BACKOFF_BASE = 30.0       # 被限流后的初始退避时间（秒）
+BACKOFF_MAX = 900.0       # 最长退避时间（秒）
+
+class AdaptivePacer:
+    """
+    守护模式下控制轮询节奏：根据每次推荐列表中新视频的比例调整间隔，
+    被限流时按指数退避（带随机抖动）暂停所有请求。
+    shared为SharedBackoff时退避时间和次数与其他进程共享，任意一个进程被限流时所有进程一起退避。
+    """
+    def __init__(self, interval=INITIAL_INTERVAL, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, shared=None):
+        self.shared = shared
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.last_poll = 0.0
+        self.blocked_until = 0.0
+        self.consecutive_limits = 0
+
+    def _sync(self):
+        """
+        读取其他进程记录的退避。
+        """
+        if self.shared is None:
+            return
+        blocked_until, self.consecutive_limits = self.shared.get("pacer")
+        self.blocked_until = max(self.blocked_until, time.monotonic() + blocked_until - time.time())
+
+    def record_poll(self, num_items, num_fresh):
+        """
+        记录一次推荐请求的结果，num_fresh为其中没见过的视频数量。
+        """
+        if self.consecutive_limits and self.shared is not None:
+            self.shared.set("pacer", 0.0, 0)
+        self.consecutive_limits = 0
+        ratio = num_fresh / num_items if num_items else 0.0
+        if ratio >= HIGH_FRESH_RATIO:
+            self.interval = max(self.min_interval, self.interval * SPEEDUP_FACTOR)
+        elif ratio <= LOW_FRESH_RATIO:
+            self.interval = min(self.max_interval, self.interval * SLOWDOWN_FACTOR)
+
+    def rate_limited(self):
+        """
+        记录一次限流，返回本次退避的秒数。
+        同一次退避期内的其他限流（例如并发的tag请求同时被拦截）属于同一次，不再加倍退避时间。
+        """
+        self._sync()
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** self.consecutive_limits)
+        delay *= random.uniform(0.5, 1.0)
+        self.consecutive_limits += 1
+        self.blocked_until = now + delay
+        if self.shared is not None:
+            self.shared.set("pacer", time.time() + delay, self.consecutive_limits)
+        self.interval = min(self.max_interval, self.interval * SLOWDOWN_FACTOR)
+        logger.warning("请求被限流，暂停 %.1f 秒", delay)
+        return delay
+
+    async def cooldown(self):
+        """
+        处于限流退避期时等待退避结束。
+        """
+        self._sync()
+        delay = self.blocked_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def wait(self):
+        """
+        在下一次推荐请求之前调用，保证与上一次请求间隔足够。
+        """
+        self._sync()
+        now = time.monotonic()
+        delay = max(self.last_poll + self.interval, self.blocked_until) - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.last_poll = time.monotonic()
@@ -1,40 +1,325 @@
+import argparse
 import asyncio
-import aiohttp
+import heapq
+import signal
+from aiohttp import web
+import logging
 from datetime import datetime
-from .recommend import fetch_items
+from .recommend import fetch_items_batch, FEEDS_PER_POLL
 from .tags import get_tags
-from utils import DEFAULT_HEADERS, TAG_SET
+from .cache import TagCache
+from .matcher import get_matcher, get_title_matcher, get_accept_matcher
+from .owners import OwnerStats, OWNER_STATS_PATH
+from .seen import SeenSet, SEEN_FILE_PATH
+from .sinks import TextSink, JsonlSink, format_result
+from .results_db import ResultStore, RESULTS_DB_PATH
+from utils import setup_logging
+from client import shared_session, RateLimited, get_policy
+from accounts import AccountPool
+from .pacer import AdaptivePacer
+from .archive import ArchiveWriter, ARCHIVE_DIR
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# 同时进行的tag请求上限
+TAG_CONCURRENCY = 8
+# 标题或UP主名字命中普通关键词的视频在tag队列中的加分，大于任何UP主的命中率，排在最前
+TITLE_HINT_BOOST = 1.0
+# 守护模式下定期保存已检查的视频和UP主统计的间隔（秒），进程被强行结束时最多丢失这么久的记录
+SAVE_INTERVAL = 300.0
 
 def test_tag(tags):
-    for tag in tags:
-        for expected in TAG_SET:
-            if expected in tag['tag_name'].lower():
-                return True
-    return False
+    """
+    返回tags中命中的关键词，未命中返回None。
+    """
+    return get_matcher().match_tags(tags)
+
+def on_rate_limited(pacer, accounts):
+    """
+    有账号池时只在所有账号都被限流后才整体退避。
+    """
+    if pacer is not None and (accounts is None or accounts.all_blocked()):
+        pacer.rate_limited()
+
+def lookup_priority(item, owners, hinted):
+    """
+    tag队列中的优先级，越大越先检查。
+    """
+    score = owners.score(item.owner_mid) if owners is not None else 0.0
+    return score + TITLE_HINT_BOOST if item.bvid in hinted else score
+
+async def check_items(items, concurrency=TAG_CONCURRENCY, session=None, cache=None, pacer=None, accounts=None, archive=None, owners=None, hinted=()):
+    """
+    并发获取一页推荐视频的tag，按完成顺序产出 (item, tags)，请求失败或被限流时tags为None。
+    待查的视频放在优先队列里：hinted中的bvid（标题或UP主名字命中了关键词）最先检查，
+    其余的在提供owners（OwnerStats）时按UP主的历史命中率从高到低检查。
+    生成器被关闭时（例如已达到max_videos），取消所有尚未完成的请求，队列里剩下的视频不再请求。
+    """
+    queue = [(-lookup_priority(item, owners, hinted), i, item) for i, item in enumerate(items)]
+    heapq.heapify(queue)
+    results = asyncio.Queue()
+
+    async def check(item):
+        if pacer is not None:
+            await pacer.cooldown()
+        account = accounts.acquire() if accounts else None
+        try:
+            with metrics.timed('tag'):
+                return item, await get_tags(item.bvid, session, cache, account, archive)
+        except RateLimited:
+            if account is not None:
+                accounts.evict(account)
+            on_rate_limited(pacer, accounts)
+            return item, None
+
+    async def worker():
+        while queue:
+            _, _, item = heapq.heappop(queue)
+            try:
+                results.put_nowait(await check(item))
+            except Exception as e:
+                results.put_nowait(e)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(items)))]
+    try:
+        for _ in range(len(items)):
+            result = await results.get()
+            if isinstance(result, Exception):
+                raise result
+            yield result
+    finally:
+        if queue:
+            metrics.inc("bili_tag_calls_avoided_total", len(queue), reason="early_stop")
+            queue.clear()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
 
-async def poll_videos(max_videos = 10, max_polls = 10):
+async def poll_videos(max_videos = 10, max_polls = 10, concurrency = TAG_CONCURRENCY, session = None, cache = None, seen = None, pacer = None, feeds = FEEDS_PER_POLL, accounts = None, archive = None, owners = None, prefilter = True, shard = None):
+    """
+    轮询推荐列表并检查tag，每发现一个命中的视频就产出 (item, keyword)。
+    seen记录已检查的视频，重复出现的视频不会再请求tag，结果中也不会出现重复项。
+    max_videos或max_polls为None时不设上限。提供pacer时按其节奏轮询并在限流时退避。
+    每次轮询并发请求feeds个推荐页，合并后一起检查tag。
+    accounts为AccountPool时推荐和tag请求轮流使用池中的账号。
+    archive为ArchiveWriter时原始的推荐和tag响应会写入归档。
+    prefilter为True时标题命中 TITLE_ACCEPT_SET 中关键词的视频直接作为结果，不再请求tag；
+    标题或UP主名字命中其他关键词的视频优先请求tag，其余视频按owners（OwnerStats）中UP主的命中率排序。
+    shard为 (index, count) 时只请求第index个分片的推荐页，多个进程轮询时各自请求不同的fresh_idx。
+    """
     num_polls = 0
-    result = []
+    num_found = 0
+    seen = SeenSet() if seen is None else seen
+    title_matcher = get_title_matcher()
+    accept_matcher = get_accept_matcher()
+    shard_index, shard_count = shard or (0, 1)
+    while max_polls is None or num_polls < max_polls:
+        if pacer is not None:
+            await pacer.wait()
+        with metrics.timed('fetch'):
+            items, limited = await fetch_items_batch(feeds, session, start_idx=(num_polls * shard_count + shard_index) * feeds + 1, accounts=accounts, archive=archive)
+        if limited:
+            # 其他账号取到的页照常检查
+            if pacer is not None:
+                on_rate_limited(pacer, accounts)
+            else:
+                logger.warning("%s 个推荐页请求被限流。", limited)
+        num_polls += 1
+        num_items = len(items)
+        items = seen.filter(items)
+        metrics.inc("bili_videos_total", num_items - len(items), result="duplicate")
+        if pacer is not None and num_items:
+            pacer.record_poll(num_items, len(items))
+        hinted = set()
+        if prefilter:
+            lookups = []
+            for i, item in enumerate(items):
+                with metrics.timed('match'):
+                    keyword = accept_matcher.match(item.title)
+                    if keyword is None and title_matcher.match_item(item) is not None:
+                        hinted.add(item.bvid)
+                if keyword is None:
+                    lookups.append(item)
+                    continue
+                metrics.inc("bili_videos_total", result="matched_title")
+                metrics.inc("bili_tag_calls_avoided_total", reason="title")
+                if owners is not None:
+                    owners.record(item.owner_mid, True)
+                logger.info("[%s] %s (标题)", keyword, format_result(item))
+                yield item, keyword
+                num_found += 1
+                if max_videos is not None and num_found >= max_videos:
+                    # 还没检查tag的视频留给下次
+                    for rest in lookups + items[i + 1:]:
+                        seen.discard(rest.bvid)
+                    return
+            items = lookups
+        if not items:
+            continue
+        pending = {item.bvid for item in items}
+        checked = check_items(items, concurrency, session, cache, pacer, accounts, archive, owners, hinted)
+        try:
+            async for item, tags in checked:
+                pending.discard(item.bvid)
+                if tags is None:
+                    # 请求失败，允许下次再检查
+                    seen.discard(item.bvid)
+                    metrics.inc("bili_videos_total", result="failed")
+                    continue
+                with metrics.timed('match'):
+                    keyword = test_tag(tags) if tags else None
+                metrics.inc("bili_videos_total", result="matched" if keyword else "checked")
+                if owners is not None:
+                    owners.record(item.owner_mid, keyword is not None)
+                if keyword:
+                    item.tags = [tag.tag_name for tag in tags]
+                    logger.info("[%s] %s", keyword, format_result(item))
+                    yield item, keyword
+                    num_found += 1
+                    if max_videos is not None and num_found >= max_videos:
+                        return
+        finally:
+            await checked.aclose()
+            # 提前结束时被取消的视频并没有检查过
+            for bvid in pending:
+                seen.discard(bvid)
+
+async def start_metrics_server(port):
+    """
+    在给定端口提供Prometheus格式的 /metrics。
+    """
+    app = web.Application()
+    app.router.add_get('/metrics', metrics.metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', port).start()
+    logger.info("指标: http://localhost:%s/metrics", port)
+    return runner
+
+async def autosave(seen, owners, interval = SAVE_INTERVAL):
+    """
+    守护模式下每隔interval秒保存一次seen和owners。
+    """
+    while True:
+        await asyncio.sleep(interval)
+        seen.save()
+        owners.save()
+        logger.debug("已保存 %s 个已检查的视频和 %s 个UP主的统计", len(seen), len(owners))
+
+def export_results(store, since = None):
+    """
+    把结果数据库导出到 results.txt。
+    """
+    sink = TextSink('results.txt')
     try:
-        while num_polls < max_polls:
-            items = await fetch_items()
-            num_polls += 1
-            for item in items:
-                bvid = item['bvid']
-                if test_tag(await get_tags(bvid)):
-                    result.append(item['title'] + ' ' + f"https://www.bilibili.com/video/{bvid}")
-                    print(f"[{datetime.now()}] {result[-1]}")
-                    if len(result) >= max_videos:
-                        return result
-    except KeyboardInterrupt:
-        return result
-    return result
+        count = store.export([sink], since)
+    finally:
+        sink.close()
+    logger.info("已导出 %s 条结果到 results.txt", count)
 
-async def main():
-    results = await poll_videos()
-    with open('results.txt', 'w+', encoding='utf-8') as f:
-        for line in results:
-            f.write(line + '\n')
+async def main(max_videos = 10, max_polls = 10, persist_seen = False, sinks = None, daemon = False, feeds = FEEDS_PER_POLL, metrics_port = None, archive = False, prefilter = True, shard = None, seen = None, db_path = RESULTS_DB_PATH, concurrency = TAG_CONCURRENCY, backoff = None):
+    """
+    每个结果立即写入db_path的结果数据库和额外的sinks，运行结束时从数据库导出 results.txt：
+    persist_seen为True时跨运行记住已检查的视频，results.txt包含数据库中的所有结果，否则只有本次运行发现的。
+    daemon为True时使用自适应节奏持续轮询，每 SAVE_INTERVAL 秒保存一次seen和owners。
+    收到SIGTERM时与Ctrl-C一样结束轮询，保存状态并导出结果后正常返回。concurrency为同时进行的tag请求上限。
+    metrics_port不为空时在该端口提供 /metrics，运行结束时打印统计汇总。
+    archive为True时把原始API响应写入 api_responses/ 下的压缩归档。
+    prefilter为True时先用标题和UP主名字筛选，UP主命中率统计随persist_seen一起保存。
+    shard、seen和backoff由多进程轮询（poll/coordinator.py）传入：seen为进程间共享的SharedSeenSet，这时由coordinator导出results.txt；
+    backoff为SharedBackoff，限流退避和账号暂停在所有worker之间共享。
+    """
+    started = datetime.now().isoformat()
+    store = ResultStore(db_path)
+    sinks = [store] + list(sinks or [])
+    cache = TagCache()
+    seen = seen if seen is not None else SeenSet(SEEN_FILE_PATH if persist_seen else None)
+    # 多进程时各worker的UP主统计不同，只读取不保存，避免互相覆盖
+    owners = OwnerStats(OWNER_STATS_PATH if persist_seen else None)
+    if shard is not None:
+        owners.path = None
+    pacer = AdaptivePacer(shared=backoff) if daemon else None
+    accounts = AccountPool.discover(shared=backoff)
+    archive = ArchiveWriter(ARCHIVE_DIR) if archive else None
+    loop = asyncio.get_running_loop()
+    if hasattr(signal, 'SIGHUP'):
+        # kill -HUP 让正在运行的轮询立即重新加载Cookie文件
+        loop.add_signal_handler(signal.SIGHUP, accounts.invalidate)
+    terminated = []
+    def terminate():
+        # 服务管理器用SIGTERM停止进程：取消主任务，让下面的finally正常保存和导出
+        terminated.append(True)
+        main_task.cancel()
+    main_task = asyncio.current_task()
+    if hasattr(signal, 'SIGTERM'):
+        loop.add_signal_handler(signal.SIGTERM, terminate)
+    saver = asyncio.create_task(autosave(seen, owners)) if daemon else None
+    metrics_runner = await start_metrics_server(metrics_port) if metrics_port else None
+    try:
+        async with shared_session() as session:
+            async for item, keyword in poll_videos(max_videos, max_polls, concurrency, session=session, cache=cache, seen=seen, pacer=pacer, feeds=feeds, accounts=accounts, archive=archive, owners=owners, prefilter=prefilter, shard=shard):
+                with metrics.timed('sink'):
+                    for sink in sinks:
+                        sink.write(item, keyword)
+    except asyncio.CancelledError:
+        if not terminated:
+            raise
+        logger.info("收到SIGTERM，正在保存并退出")
+    finally:
+        if saver is not None:
+            saver.cancel()
+        if hasattr(signal, 'SIGTERM'):
+            loop.remove_signal_handler(signal.SIGTERM)
+        cache.report()
+        cache.close()
+        seen.save()
+        owners.save()
+        if archive is not None:
+            archive.close()
+        if shard is None:
+            export_results(store, None if persist_seen else started)
+        for sink in sinks:
+            sink.close()
+        logger.info("省下的tag请求: 标题/UP主命中 %s 次, 提前结束 %s 次",
+                    metrics.get("bili_tag_calls_avoided_total", reason="title"),
+                    metrics.get("bili_tag_calls_avoided_total", reason="early_stop"))
+        print(metrics.summary())
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+def build_parser(description="轮询B站推荐列表，按tag筛选视频"):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--max-videos', type=int, help="找到多少个视频后停止，0表示不限（默认10，守护模式不限）")
+    parser.add_argument('--max-polls', type=int, help="最多轮询多少次推荐列表，0表示不限（默认10，守护模式不限）")
+    parser.add_argument('--feeds', type=int, default=FEEDS_PER_POLL, help="每次轮询并发请求的推荐页数")
+    parser.add_argument('--concurrency', type=int, default=TAG_CONCURRENCY, help=f"同时进行的tag请求上限（默认{TAG_CONCURRENCY}）")
+    parser.add_argument('--daemon', action='store_true', help="守护模式：自适应节奏持续轮询，被限流时自动退避")
+    parser.add_argument('--persist-seen', action='store_true', help="跨运行记住已检查过的视频")
+    parser.add_argument('--jsonl', help="额外把结果（含完整视频信息）追加到该JSONL文件")
+    parser.add_argument('--sqlite', default=RESULTS_DB_PATH, help=f"结果数据库（默认 {RESULTS_DB_PATH}），可用 python -m poll.results_db 查询")
+    parser.add_argument('--archive', action='store_true', help=f"把原始API响应写入 {ARCHIVE_DIR}/ 下的压缩归档")
+    parser.add_argument('--hedge', action='store_true', help="tag请求超过最近p95延迟仍未返回时再发一个，取先返回的")
+    parser.add_argument('--no-prefilter', action='store_true', help="不用标题和UP主名字预筛选和排序，每个视频都请求tag")
+    parser.add_argument('--metrics-port', type=int, help="在该端口提供Prometheus格式的 /metrics")
+    return parser
+
+def resolve_limits(args):
+    """
+    返回 (max_videos, max_polls)，None表示不限。
+    """
+    default_limit = 0 if args.daemon else 10
+    max_videos = default_limit if args.max_videos is None else args.max_videos
+    max_polls = default_limit if args.max_polls is None else args.max_polls
+    return max_videos or None, max_polls or None
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    args = build_parser().parse_args()
+    setup_logging()
+    get_policy("tags").hedge = args.hedge
+    max_videos, max_polls = resolve_limits(args)
+    sinks = [JsonlSink(args.jsonl)] if args.jsonl else []
+    try:
+        asyncio.run(main(max_videos, max_polls, args.persist_seen, sinks, args.daemon, args.feeds, args.metrics_port, args.archive, not args.no_prefilter, db_path=args.sqlite, concurrency=max(1, args.concurrency)))
+    except KeyboardInterrupt:
+        print("\n程序被用户中断，已保存的结果见 results.txt。")
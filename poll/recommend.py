@@ -1,20 +1,39 @@
 import aiohttp
 import asyncio
-import json
-import os
-from datetime import datetime
+import logging
 from utils import *
+import metrics
+from client import get_session, shared_session, check_rate_limit, RateLimited, get_policy
+from .archive import ArchiveWriter, ARCHIVE_DIR
+from .records import loads, DecodeError, parse_items
+
+logger = logging.getLogger(__name__)
 
 # --- 配置常量 ---
-RECOMMEND_API_URL = "https://api.bilibili.com/x/web-interface/index/top/feed/rcmd" # B站推荐列表API
-OUTPUT_DIR = "api_responses" # 保存API响应的目录
+RECOMMEND_API_URL = f"{API_BASE_URL}/x/web-interface/index/top/feed/rcmd" # B站推荐列表API
+OUTPUT_DIR = ARCHIVE_DIR # 保存API响应的目录
+FEEDS_PER_POLL = 3 # 每次轮询并发请求的推荐页数
+MAX_FEEDS_PER_POLL = 8 # 并发推荐请求数的上限，避免触发风控
+
+def feed_params(fresh_idx, page_size=None):
+    """
+    推荐接口的刷新参数：fresh_idx/fresh_idx_1h/brush 表示第几次刷新，不同的值返回不同的推荐页。
+    """
+    params = {"fresh_type": 4, "fresh_idx": fresh_idx, "fresh_idx_1h": fresh_idx, "brush": fresh_idx}
+    if page_size:
+        params["ps"] = page_size
+    return params
 
-async def fetch_bilibili_recommendations(cookies):
+async def fetch_bilibili_recommendations(cookies, session=None, params=None, headers=None, archive=None):
     """
     使用提供的Cookie获取B站首页推荐列表。
+    session为空时使用共享的ClientSession。被限流时抛出RateLimited。
+    超时和重试按client.POLICIES["recommend"]执行，重试用完仍失败时返回None。
+    headers为预先生成好的带Cookie请求头，提供时不再重新拼接。
+    提供archive（ArchiveWriter）时把成功的响应追加到归档。
     """
     if not cookies:
-        print(f"[{datetime.now()}] 未提供Cookie，无法获取推荐列表。")
+        logger.warning("未提供Cookie，无法获取推荐列表。")
         return None
 
     # aiohttp的ClientSession可以传入cookies参数，或者通过cookie_jar管理
@@ -23,9 +42,7 @@ async def fetch_bilibili_recommendations(cookies):
     # 对于B站这种，直接传入字典通常也够用，但为了更像浏览器，我们可以手动设置Cookie头
     
     # 方式一: 直接在headers中构建Cookie字符串 (更直接)
-    cookie_str = "; ".join([f"{k}={v}" for k, v in cookies.items()])
-    request_headers = DEFAULT_HEADERS.copy()
-    request_headers['Cookie'] = cookie_str
+    request_headers = headers or cookie_header(cookies)
     
     # 方式二: 使用aiohttp的cookie_jar (推荐，更符合HTTP规范)
     # client_session = aiohttp.ClientSession()
@@ -33,51 +50,44 @@ async def fetch_bilibili_recommendations(cookies):
     #     client_session.cookie_jar.update_cookies({k: v}, response_url=RECOMMEND_API_URL)
     # request_headers = DEFAULT_HEADERS.copy() # 此时headers不再需要手动加Cookie
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            # 使用方式一：直接在headers中传入Cookie字符串
-            async with session.get(RECOMMEND_API_URL, headers=request_headers) as response:
-                response.raise_for_status() # 检查HTTP状态码，如果不是2xx则抛出异常
-                
-                api_response_json = await response.json()
-                print(f"[{datetime.now()}] B站推荐列表API响应状态码: {response.status}")
-                print(f"[{datetime.now()}] B站推荐列表API响应数据（部分）: {str(api_response_json)[:500]}...")
-
-                if api_response_json.get('code') == 0:
-                    print(f"[{datetime.now()}] 成功获取B站推荐列表。")
-                    return api_response_json
-                else:
-                    print(f"[{datetime.now()}] 获取推荐列表API返回错误码: {api_response_json.get('code')}")
-                    print(f"[{datetime.now()}] 错误信息: {api_response_json.get('message', '无')}")
-                    return None
-        except aiohttp.ClientError as e:
-            print(f"[{datetime.now()}] 网络请求错误: {e}")
-            return None
-        except json.JSONDecodeError:
-            print(f"[{datetime.now()}] API响应不是有效的JSON格式。")
-            return None
-        except Exception as e:
-            print(f"[{datetime.now()}] 获取推荐列表时发生意外错误: {e}")
-            return None
-
-def save_data_to_json(data, filename_prefix="bilibili_recommendations"):
-    """
-    将数据保存为JSON文件。
-    """
-    if not data:
-        print(f"[{datetime.now()}] 没有数据可保存。")
-        return
-
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.join(OUTPUT_DIR, f"{filename_prefix}_{timestamp}.json")
+    # 复用共享会话的连接池，避免每次请求都重新建立TCP+TLS连接
+    session = session or get_session()
+
+    async def request(timeout):
+        # 使用方式一：直接在headers中传入Cookie字符串
+        async with session.get(RECOMMEND_API_URL, params=params, headers=request_headers, timeout=timeout) as response:
+            check_rate_limit(response.status)
+            response.raise_for_status() # 检查HTTP状态码，如果不是2xx则抛出异常
+            raw = await response.read()
+            with metrics.timed('decode'):
+                api_response_json = loads(raw)
+            check_rate_limit(response.status, api_response_json.get('code'), response.url.path)
+            logger.debug("B站推荐列表API响应状态码: %s, %s 字节", response.status, len(raw))
+            return api_response_json, raw
 
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-        print(f"[{datetime.now()}] 推荐列表数据已保存到: {file_path}")
+        api_response_json, raw = await get_policy("recommend").run(request)
+        if api_response_json.get('code') == 0:
+            logger.debug("成功获取B站推荐列表。")
+            if archive is not None:
+                # 直接归档原始字节，不再重新编码
+                archive.write_raw("recommend", (params or {}).get("fresh_idx"), raw)
+            return api_response_json
+        else:
+            logger.warning("获取推荐列表API返回错误码: %s, 错误信息: %s",
+                           api_response_json.get('code'), api_response_json.get('message', '无'))
+            return None
+    except RateLimited:
+        raise
+    except aiohttp.ClientError as e:
+        logger.warning("网络请求错误: %s", e)
+        return None
+    except DecodeError:
+        logger.warning("API响应不是有效的JSON格式。")
+        return None
     except Exception as e:
-        print(f"[{datetime.now()}] 保存数据到文件时发生错误: {e}")
+        logger.error("获取推荐列表时发生意外错误: %s", e)
+        return None
 
 # --- 主执行函数 ---
 
@@ -89,29 +99,65 @@ async def main():
     # 1. 加载Cookie
     cookies = load_cookies(COOKIES_FILE_PATH)
     if not cookies:
-        print(f"[{datetime.now()}] 无法继续，请确保 '{COOKIES_FILE_PATH}' 文件存在且内容正确。")
+        logger.error("无法继续，请确保 '%s' 文件存在且内容正确。", COOKIES_FILE_PATH)
         print("-------------------------------------------------------")
         return
 
-    # 2. 使用Cookie获取推荐列表
-    recommendations_data = await fetch_bilibili_recommendations(cookies)
-
-    # 3. 保存数据
-    save_data_to_json(recommendations_data)
+    # 2. 使用Cookie获取推荐列表，成功的响应写入归档
+    archive = ArchiveWriter(OUTPUT_DIR)
+    try:
+        async with shared_session() as session:
+            recommendations_data = await fetch_bilibili_recommendations(cookies, session, archive=archive)
+    finally:
+        # 3. 保存数据
+        archive.close()
+    if recommendations_data:
+        logger.info("推荐列表数据已归档到: %s", OUTPUT_DIR)
 
     print("-------------------------------------------------------")
     print("B站API客户端操作完成。")
     print("-------------------------------------------------------")
 
-# returns array of objects.
-async def fetch_items():
-    cookies = load_cookies(COOKIES_FILE_PATH)
-    data = await fetch_bilibili_recommendations(cookies)
-    if not data or not 'data' in data.keys() or not 'item' in data['data'].keys():
+# returns list of records.Item
+async def fetch_items(session=None, params=None, account=None, archive=None):
+    provider = account.provider if account is not None else get_cookie_provider(COOKIES_FILE_PATH)
+    data = await fetch_bilibili_recommendations(provider.cookies(), session, params, provider.headers(), archive)
+    if not data:
         return None
-    return data['data']['item']
+    # 保留完整的卡片，命中的视频写入结果数据库和JSONL时不丢字段
+    return parse_items(data, keep_raw=True)
+
+async def fetch_items_batch(feeds=FEEDS_PER_POLL, session=None, start_idx=1, page_size=None, accounts=None, archive=None):
+    """
+    并发请求feeds个推荐页（fresh_idx从start_idx开始递增），合并并按bvid去重。
+    提供accounts（AccountPool）时每页从账号池取一个账号，被限流的账号会被暂时移出。
+    返回 (items, limited)：limited为被限流的页数，其他账号成功取到的页照常返回。
+    """
+    async def fetch_page(i):
+        account = accounts.acquire() if accounts else None
+        try:
+            return await fetch_items(session, feed_params(start_idx + i, page_size), account, archive)
+        except RateLimited:
+            if account is not None:
+                accounts.evict(account)
+            raise
+
+    feeds = max(1, min(feeds, MAX_FEEDS_PER_POLL))
+    pages = await asyncio.gather(*(fetch_page(i) for i in range(feeds)), return_exceptions=True)
+    merged = {}
+    limited = 0
+    for page in pages:
+        if isinstance(page, RateLimited):
+            limited += 1
+            continue
+        if isinstance(page, BaseException):
+            raise page
+        for item in page or []:
+            merged.setdefault(item.bvid, item)
+    return list(merged.values()), limited
     
 # --- 程序入口 ---
 if __name__ == "__main__":
+    setup_logging()
     asyncio.run(main())
 
@@ -0,0 +1,106 @@
+"""
+接口响应的解码和精简记录：只保留用到的字段，用 __slots__ 减少每条记录的内存。
+安装了 orjson 或 msgspec 时用它们解码JSON，否则退回标准库 json。
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    loads = orjson.loads
+    DecodeError = (ValueError,)  # orjson.JSONDecodeError 是 ValueError 的子类
+elif msgspec is not None:
+    loads = msgspec.json.decode
+    DecodeError = (ValueError, msgspec.DecodeError)
+else:
+    loads = json.loads
+    DecodeError = (ValueError,)
+
+class Tag:
+    __slots__ = ('tag_id', 'tag_name')
+
+    def __init__(self, tag_id, tag_name):
+        self.tag_id = tag_id
+        self.tag_name = tag_name
+
+    def __repr__(self):
+        return f"Tag({self.tag_id!r}, {self.tag_name!r})"
+
+class Item:
+    """
+    推荐列表中的一个视频。to_dict 返回与接口相同结构的dict，用于写入结果文件。
+    tags为检查过的tag名列表，没有请求过tag时为None。
+    raw为接口返回的完整视频信息（含stat等没有单独保存的字段），只在需要写入结果时保留，否则为None。
+    """
+    __slots__ = ('id', 'bvid', 'title', 'owner_mid', 'owner_name', 'pubdate', 'duration', 'pic', 'tags', 'raw')
+
+    def __init__(self, id, bvid, title, owner_mid = None, owner_name = None, pubdate = None, duration = None, pic = None, tags = None, raw = None):
+        self.id = id
+        self.bvid = bvid
+        self.title = title
+        self.owner_mid = owner_mid
+        self.owner_name = owner_name
+        self.pubdate = pubdate
+        self.duration = duration
+        self.pic = pic
+        self.tags = tags
+        self.raw = raw
+
+    @classmethod
+    def from_dict(cls, data, keep_raw = False):
+        owner = data.get('owner') or {}
+        return cls(data.get('id'), data['bvid'], data.get('title', ''), owner.get('mid'), owner.get('name'),
+                   data.get('pubdate'), data.get('duration'), data.get('pic'), data.get('tags'),
+                   data if keep_raw else None)
+
+    def to_dict(self):
+        if self.raw is not None:
+            data = dict(self.raw)
+            if self.tags is not None:
+                data["tags"] = self.tags
+            return data
+        data = {
+            "id": self.id,
+            "bvid": self.bvid,
+            "title": self.title,
+            "owner": {"mid": self.owner_mid, "name": self.owner_name},
+            "pubdate": self.pubdate,
+            "duration": self.duration,
+            "pic": self.pic,
+        }
+        if self.tags is not None:
+            data["tags"] = self.tags
+        return data
+
+    def __repr__(self):
+        return f"Item({self.bvid!r}, {self.title!r})"
+
+def parse_items(response, keep_raw = False):
+    """
+    从推荐列表接口的响应中取出视频，跳过没有bvid的广告/直播卡片。
+    keep_raw为True时每条记录保留完整的卡片，用于写入结果。
+    """
+    data = response.get('data') or {}
+    return [Item.from_dict(card, keep_raw) for card in data.get('item') or () if card.get('bvid')]
+
+def parse_tags(tags):
+    """
+    把tag接口的 data 数组（或缓存中保存的 [tag_id, tag_name] 列表）转换成Tag记录。
+    """
+    if tags is None:
+        return None
+    return [Tag(tag[0], tag[1]) if isinstance(tag, list) else Tag(tag.get('tag_id'), tag['tag_name']) for tag in tags]
+
+def dump_tags(tags):
+    """
+    Tag记录转换成可以JSON序列化的 [tag_id, tag_name] 列表。
+    """
+    return [[tag.tag_id, tag.tag_name] for tag in tags]
@@ -0,0 +1,142 @@
+"""
+离线重放：不访问网络，把 api_responses/ 中归档的推荐列表和tag响应重新走一遍匹配，
+用于修改 utils.TAG_SET 之后查看哪些视频会新命中或不再命中。
+
+用法: python -m poll.replay [--archive-dir api_responses] [--output replay_results.jsonl] [--workers N] [--keyword K ...]
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import logging
+from .archive import ARCHIVE_DIR, list_segments, iter_records
+from .matcher import reload_matcher, get_accept_matcher
+from .poll_videos import test_tag
+from .sinks import format_result
+from utils import setup_logging
+from .records import Item, parse_items, parse_tags
+
+logger = logging.getLogger(__name__)
+
+# --- 配置常量 ---
+REPLAY_OUTPUT_PATH = "replay_results.jsonl" # 重放结果，下次重放时作为对比的基准
+
+def init_worker(keywords):
+    if keywords:
+        reload_matcher(keywords)
+
+def scan_segment(path):
+    """
+    在工作进程中解压并匹配一个分段文件。
+    返回 (items, tags)：items为 bvid -> (records.Item, 标题命中的 TITLE_ACCEPT_SET 关键词)，
+    tags为 bvid -> tag命中的关键词（未命中为None）。
+    """
+    accept_matcher = get_accept_matcher()
+    items = {}
+    tags = {}
+    for record in iter_records(path):
+        data = record["data"]
+        if record["kind"] == "recommend":
+            for item in parse_items(data):
+                if item.bvid not in items:
+                    items[item.bvid] = (item, accept_matcher.match(item.title))
+        elif record["kind"] == "tags" and data.get("data") is not None:
+            # 同一个视频的tag以最后一次归档的为准
+            tags[record["key"]] = test_tag(parse_tags(data["data"]))
+    return items, tags
+
+def replay(directory = ARCHIVE_DIR, workers = None, keywords = None, prefilter = True):
+    """
+    并行扫描所有分段，返回 bvid -> (keyword, item) 的命中结果以及统计信息。
+    与poll_videos相同，prefilter为True时标题命中 TITLE_ACCEPT_SET 中关键词的视频不看tag直接算作命中。
+    """
+    segments = list_segments(directory)
+    items = {}
+    tags = {}
+    if workers == 1 or len(segments) <= 1:
+        init_worker(keywords)
+        scanned = map(scan_segment, segments)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(keywords,))
+        scanned = executor.map(scan_segment, segments)
+    try:
+        # map按分段顺序返回，后面的分段覆盖前面的tag结果
+        for segment_items, segment_tags in scanned:
+            for bvid, entry in segment_items.items():
+                items.setdefault(bvid, entry)
+            tags.update(segment_tags)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    results = {}
+    for bvid, (item, title_keyword) in items.items():
+        keyword = (title_keyword if prefilter else None) or tags.get(bvid)
+        if keyword is not None:
+            results[bvid] = (keyword, item)
+    stats = {"segments": len(segments), "videos": len(items), "tagged": len(tags),
+             "untagged": len(items.keys() - tags.keys()), "matched": len(results)}
+    return results, stats
+
+def load_results(path):
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                item = Item.from_dict(record["item"])
+                results[item.bvid] = (record["keyword"], item)
+    return results
+
+def save_results(path, results):
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for bvid in sorted(results):
+            keyword, item = results[bvid]
+            f.write(json.dumps({"keyword": keyword, "item": item.to_dict()}, ensure_ascii=False, separators=(',', ':')) + '\n')
+    os.replace(temp_path, path)
+
+def diff_results(previous, current):
+    """
+    返回 (新增, 移除, 关键词变化) 三个bvid列表。
+    """
+    added = sorted(current.keys() - previous.keys())
+    removed = sorted(previous.keys() - current.keys())
+    changed = sorted(bvid for bvid in current.keys() & previous.keys() if current[bvid][0] != previous[bvid][0])
+    return added, removed, changed
+
+def main(directory = ARCHIVE_DIR, output = REPLAY_OUTPUT_PATH, workers = None, keywords = None, prefilter = True):
+    start = time.perf_counter()
+    results, stats = replay(directory, workers, keywords, prefilter)
+    elapsed = time.perf_counter() - start
+    logger.info("重放了 %s 个分段: %s 个视频, %s 个有tag, %s 个没有归档tag, 命中 %s 个, 耗时 %.2f 秒",
+                stats['segments'], stats['videos'], stats['tagged'], stats['untagged'], stats['matched'], elapsed)
+
+    previous = load_results(output)
+    added, removed, changed = diff_results(previous, results)
+    for bvid in added:
+        keyword, item = results[bvid]
+        print(f"+ {format_result(item)} [{keyword}]")
+    for bvid in removed:
+        keyword, item = previous[bvid]
+        print(f"- {format_result(item)} [{keyword}]")
+    for bvid in changed:
+        keyword, item = results[bvid]
+        print(f"~ {format_result(item)} [{previous[bvid][0]} -> {keyword}]")
+    logger.info("与上次结果相比: 新增 %s, 移除 %s, 关键词变化 %s", len(added), len(removed), len(changed))
+    save_results(output, results)
+    logger.info("重放结果已保存到: %s", output)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="离线重放归档的API响应，重新匹配关键词")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR, help="归档目录")
+    parser.add_argument('--output', default=REPLAY_OUTPUT_PATH, help="结果文件，已存在时先与它对比再覆盖")
+    parser.add_argument('--workers', type=int, default=None, help="解压和匹配的进程数，默认为CPU核数")
+    parser.add_argument('--keyword', action='append', help="使用指定的关键词代替 utils.TAG_SET，可重复")
+    parser.add_argument('--no-prefilter', action='store_true', help="只按tag匹配，不使用标题")
+    args = parser.parse_args()
+    setup_logging()
+    main(args.archive_dir, args.output, args.workers, args.keyword, not args.no_prefilter)
@@ -0,0 +1,319 @@
+"""
+结果数据库：命中的视频保存在SQLite中，bvid、UP主、关键词、发现时间上有索引，标题和tag有FTS5全文索引：
+3个字符及以上的搜索用trigram分词的索引，2个字符的（如“爱音”“祥子”）用单独的二元组索引。
+results.txt 由数据库导出。
+
+用法: python -m poll.results_db query [--keyword mygo] [--owner UP主名字或mid] [--search 标题或tag] [--since 7d] [--limit 50]
+      python -m poll.results_db export [--output results.txt] [--since 7d]
+      python -m poll.results_db stats
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from utils import setup_logging
+from .records import Item
+from .matcher import normalize
+from .sinks import TextSink, format_result
+
+logger = logging.getLogger(__name__)
+
+# --- 配置常量 ---
+RESULTS_DB_PATH = "results.sqlite3"
+SQLITE_TIMEOUT = 30.0 # 其他进程正在写入时最多等待的秒数
+QUERY_LIMIT = 100     # 查询默认最多返回的条数
+FTS_MIN_QUERY_LEN = 3 # trigram分词的全文索引只能查3个字符及以上
+BIGRAM_QUERY_LEN = 2  # 2个字符的搜索用二元组索引，1个字符的退回到LIKE
+
+# 旧版 SqliteSink 的表只有前7列，打开时补上缺少的列
+COLUMNS = [
+    ("bvid", "TEXT PRIMARY KEY"),
+    ("title", "TEXT"),
+    ("keyword", "TEXT"),
+    ("owner_mid", "INTEGER"),
+    ("owner_name", "TEXT"),
+    ("found_at", "TEXT"),      # 第一次发现的时间
+    ("item", "TEXT"),
+    ("tags", "TEXT"),          # 空格分隔的tag名，标题预筛选命中的视频没有tag
+    ("last_seen_at", "TEXT"),  # 最近一次被发现的时间
+    ("grams", "TEXT"),         # 标题和tag中空格分隔的二元组，供2个字符的搜索使用
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS results_keyword ON results(keyword COLLATE NOCASE, found_at)",
+    "CREATE INDEX IF NOT EXISTS results_owner_mid ON results(owner_mid, found_at)",
+    "CREATE INDEX IF NOT EXISTS results_owner_name ON results(owner_name, found_at)",
+    "CREATE INDEX IF NOT EXISTS results_found_at ON results(found_at)",
+    "CREATE INDEX IF NOT EXISTS results_last_seen_at ON results(last_seen_at)",
+]
+
+# 外部内容的FTS5表，由触发器与results保持同步
+FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS results_ai AFTER INSERT ON results BEGIN
+        INSERT INTO results_fts(rowid, title, tags) VALUES (new.rowid, new.title, new.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS results_ad AFTER DELETE ON results BEGIN
+        INSERT INTO results_fts(results_fts, rowid, title, tags) VALUES ('delete', old.rowid, old.title, old.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS results_au AFTER UPDATE OF title, tags ON results BEGIN
+        INSERT INTO results_fts(results_fts, rowid, title, tags) VALUES ('delete', old.rowid, old.title, old.tags);
+        INSERT INTO results_fts(rowid, title, tags) VALUES (new.rowid, new.title, new.tags);
+    END""",
+]
+
+# 二元组列用unicode61分词，每个二元组是一个词
+BIGRAM_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS results_grams_ai AFTER INSERT ON results BEGIN
+        INSERT INTO results_grams(rowid, grams) VALUES (new.rowid, new.grams);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS results_grams_ad AFTER DELETE ON results BEGIN
+        INSERT INTO results_grams(results_grams, rowid, grams) VALUES ('delete', old.rowid, old.grams);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS results_grams_au AFTER UPDATE OF grams ON results BEGIN
+        INSERT INTO results_grams(results_grams, rowid, grams) VALUES ('delete', old.rowid, old.grams);
+        INSERT INTO results_grams(rowid, grams) VALUES (new.rowid, new.grams);
+    END""",
+]
+
+UPSERT = (
+    "INSERT INTO results (bvid, title, keyword, owner_mid, owner_name, found_at, item, tags, last_seen_at, grams) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(bvid) DO UPDATE SET title = excluded.title, keyword = excluded.keyword, "
+    "owner_mid = excluded.owner_mid, owner_name = excluded.owner_name, item = excluded.item, "
+    "tags = COALESCE(excluded.tags, results.tags), last_seen_at = excluded.last_seen_at, "
+    "grams = CASE WHEN excluded.tags IS NULL THEN results.grams ELSE excluded.grams END"
+)
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def bigrams(*texts):
+    """
+    把文本归一化后拆成相邻两个字母/数字/汉字组成的二元组，去重后用空格连接。
+    """
+    grams = {}
+    for text in texts:
+        text = normalize(text or "")
+        for i in range(len(text) - 1):
+            if text[i].isalnum() and text[i + 1].isalnum():
+                grams[text[i:i + 2]] = None
+    return " ".join(grams)
+
+def parse_since(value):
+    """
+    "7d"、"12h"、"30m" 表示最近一段时间，其他按ISO格式的日期/时间解析。
+    """
+    if value is None:
+        return None
+    found = re.fullmatch(r'(\d+)([dhm])', value)
+    if found:
+        amount, unit = int(found.group(1)), found.group(2)
+        delta = {"d": timedelta(days=amount), "h": timedelta(hours=amount), "m": timedelta(minutes=amount)}[unit]
+        return (datetime.now() - delta).isoformat()
+    return datetime.fromisoformat(value).isoformat()
+
+class ResultStore:
+    """
+    结果数据库，同时实现sink接口（write/close）：同一个视频再次命中时更新，保留第一次发现的时间。
+    使用WAL模式，多个轮询进程可以同时写入。
+    """
+    def __init__(self, path = RESULTS_DB_PATH, timeout = SQLITE_TIMEOUT):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=timeout)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (" + ", ".join(f"{name} {kind}" for name, kind in COLUMNS) + ")")
+        existing = {row["name"] for row in self.db.execute("PRAGMA table_info(results)")}
+        for name, kind in COLUMNS:
+            if name not in existing:
+                self.db.execute(f"ALTER TABLE results ADD COLUMN {name} {kind}")
+        for statement in INDEXES:
+            self.db.execute(statement)
+        self.fts = self._create_fts()
+        self.bigrams = self.fts and self._create_bigrams()
+        self.db.commit()
+
+    def _create_fts(self):
+        """
+        建立全文索引，返回是否可用（SQLite没有编译FTS5或不支持trigram时退回到LIKE查询）。
+        """
+        if self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'results_fts'").fetchone():
+            return True
+        try:
+            self.db.execute("CREATE VIRTUAL TABLE results_fts USING fts5("
+                            "title, tags, content='results', content_rowid='rowid', tokenize='trigram')")
+        except sqlite3.OperationalError as e:
+            logger.warning("无法建立全文索引，全文搜索将退回到LIKE: %s", e)
+            return False
+        for statement in FTS_TRIGGERS:
+            self.db.execute(statement)
+        # 旧数据库里已有的结果
+        self.db.execute("INSERT INTO results_fts(results_fts) VALUES ('rebuild')")
+        return True
+
+    def _create_bigrams(self):
+        """
+        建立2个字符搜索用的二元组索引，返回是否可用。旧数据库里已有的结果在这里补上grams列。
+        """
+        if self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'results_grams'").fetchone():
+            return True
+        try:
+            self.db.execute("CREATE VIRTUAL TABLE results_grams USING fts5("
+                            "grams, content='results', content_rowid='rowid', tokenize='unicode61')")
+        except sqlite3.OperationalError as e:
+            logger.warning("无法建立二元组索引，2个字符的搜索将退回到LIKE: %s", e)
+            return False
+        rows = self.db.execute("SELECT rowid, title, tags FROM results WHERE grams IS NULL").fetchall()
+        # 旧版的results_au在任何列更新时都会重建trigram索引，补grams列之前换成只在标题和tag变化时触发
+        self.db.execute("DROP TRIGGER IF EXISTS results_au")
+        for statement in FTS_TRIGGERS:
+            self.db.execute(statement)
+        self.db.executemany("UPDATE results SET grams = ? WHERE rowid = ?",
+                            ((bigrams(row["title"], row["tags"]), row["rowid"]) for row in rows))
+        for statement in BIGRAM_TRIGGERS:
+            self.db.execute(statement)
+        self.db.execute("INSERT INTO results_grams(results_grams) VALUES ('rebuild')")
+        return True
+
+    def write(self, item, keyword, found_at=None):
+        now = datetime.now().isoformat()
+        tags = " ".join(item.tags) if item.tags else None
+        self.db.execute(UPSERT, (item.bvid, item.title, keyword, item.owner_mid, item.owner_name, found_at or now,
+                                 json.dumps(item.to_dict(), ensure_ascii=False), tags, now, bigrams(item.title, tags)))
+        self.db.commit()
+
+    def query(self, keyword = None, owner = None, search = None, since = None, limit = QUERY_LIMIT):
+        """
+        按条件查询，最新发现的在前。owner为数字时按mid查，否则按UP主名字查；
+        search在标题和tag中全文搜索（1个字符或含标点的2个字符搜索没有索引）；since为ISO格式时间，只返回之后发现的。
+        """
+        conditions = []
+        params = []
+        if keyword:
+            conditions.append("keyword = ? COLLATE NOCASE")
+            params.append(keyword)
+        if owner:
+            conditions.append("owner_mid = ?" if owner.isdigit() else "owner_name = ?")
+            params.append(int(owner) if owner.isdigit() else owner)
+        if search:
+            gram = normalize(search)
+            if self.fts and len(search) >= FTS_MIN_QUERY_LEN:
+                conditions.append("rowid IN (SELECT rowid FROM results_fts WHERE results_fts MATCH ?)")
+                params.append('"' + search.replace('"', '""') + '"')
+            elif self.bigrams and len(gram) == BIGRAM_QUERY_LEN and gram.isalnum():
+                conditions.append("rowid IN (SELECT rowid FROM results_grams WHERE results_grams MATCH ?)")
+                params.append('"' + gram + '"')
+            else:
+                conditions.append("(title LIKE ? ESCAPE '\\' OR tags LIKE ? ESCAPE '\\')")
+                pattern = '%' + _escape_like(search) + '%'
+                params += [pattern, pattern]
+        if since:
+            conditions.append("found_at >= ?")
+            params.append(since)
+        sql = "SELECT * FROM results"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY found_at DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self.db.execute(sql, params).fetchall()
+
+    def export(self, sinks, since = None):
+        """
+        把最近一次发现时间不早于since（为None时全部）的结果按发现顺序写入sinks，返回条数。
+        """
+        sql = "SELECT keyword, item, found_at FROM results"
+        params = ()
+        if since:
+            sql += " WHERE last_seen_at >= ?"
+            params = (since,)
+        count = 0
+        for row in self.db.execute(sql + " ORDER BY found_at", params):
+            item = Item.from_dict(json.loads(row["item"]), keep_raw=True)
+            for sink in sinks:
+                sink.write(item, row["keyword"], row["found_at"])
+            count += 1
+        return count
+
+    def stats(self):
+        """
+        返回 (总数, [(关键词, 数量), ...])。
+        """
+        total = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        by_keyword = self.db.execute(
+            "SELECT keyword, COUNT(*) AS n FROM results GROUP BY keyword COLLATE NOCASE ORDER BY n DESC").fetchall()
+        return total, [(row["keyword"], row["n"]) for row in by_keyword]
+
+    def close(self):
+        self.db.close()
+
+def export_text(path = RESULTS_DB_PATH, output = "results.txt", since = None):
+    """
+    把数据库导出成 results.txt 格式（每行 "标题 URL"），返回条数。
+    """
+    store = ResultStore(path)
+    sink = TextSink(output)
+    try:
+        return store.export([sink], since)
+    finally:
+        sink.close()
+        store.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="查询和导出结果数据库")
+    parser.add_argument('--db', default=RESULTS_DB_PATH, help="结果数据库路径")
+    commands = parser.add_subparsers(dest='command', required=True)
+    query = commands.add_parser('query', help="查询结果")
+    query.add_argument('--keyword', help="命中的关键词（不区分大小写）")
+    query.add_argument('--owner', help="UP主名字或mid")
+    query.add_argument('--search', help="在标题和tag中搜索")
+    query.add_argument('--since', help="只看最近发现的，如 7d、12h，或ISO格式的时间")
+    query.add_argument('--limit', type=int, default=QUERY_LIMIT, help="最多返回多少条，0表示不限")
+    query.add_argument('--jsonl', action='store_true', help="每行输出一个JSON对象")
+    export = commands.add_parser('export', help="导出为results.txt格式")
+    export.add_argument('--output', default="results.txt")
+    export.add_argument('--since', help="只导出最近发现的，如 7d")
+    commands.add_parser('stats', help="按关键词统计")
+    args = parser.parse_args()
+    setup_logging()
+
+    if args.command == 'export':
+        count = export_text(args.db, args.output, parse_since(args.since))
+        logger.info("已导出 %s 条结果到 %s", count, args.output)
+        return
+    store = ResultStore(args.db)
+    try:
+        if args.command == 'stats':
+            total, by_keyword = store.stats()
+            print(f"共 {total} 个视频")
+            for keyword, count in by_keyword:
+                print(f"  {keyword}: {count}")
+            return
+        start = time.perf_counter()
+        rows = store.query(args.keyword, args.owner, args.search, parse_since(args.since), args.limit)
+        elapsed = time.perf_counter() - start
+        for row in rows:
+            if args.jsonl:
+                record = {"found_at": row["found_at"], "keyword": row["keyword"], "tags": row["tags"],
+                          "item": json.loads(row["item"])}
+                print(json.dumps(record, ensure_ascii=False))
+            else:
+                item = Item.from_dict(json.loads(row["item"]))
+                print(f"{row['found_at'][:19]} [{row['keyword']}] {format_result(item)} ({row['owner_name']})")
+        logger.info("共 %s 条，查询耗时 %.1f ms", len(rows), elapsed * 1000)
+    finally:
+        store.close()
+
+if __name__ == '__main__':
+    main()
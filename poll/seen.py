@@ -0,0 +1,187 @@
+import os
+import sqlite3
+from array import array
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- 配置常量 ---
+SEEN_FILE_PATH = "cache/seen_av.bin"  # 已检查视频的AV号，排好序的uint64数组
+SHARED_SEEN_DB_PATH = "cache/seen_shared.sqlite3" # 多进程轮询时共享的已检查视频
+SQLITE_TIMEOUT = 30.0 # 其他进程正在写入时最多等待的秒数
+
+# BV号与AV号互转所用的常量，见 bilibili-API-collect 文档
+XOR_CODE = 23442827791579
+MASK_CODE = 2251799813685247
+MAX_AID = 1 << 51
+ALPHABET = "FcwAPNKTMug3GV5Lj7EJnHpWsx4tb8haYeviqBz6rkCy12mUSDQX9RdoZf"
+ALPHABET_INDEX = {c: i for i, c in enumerate(ALPHABET)}
+
+def bv2av(bvid):
+    """
+    把BV号解码成AV号，格式不对时返回None。
+    """
+    if len(bvid) != 12 or not bvid.startswith("BV1"):
+        return None
+    chars = list(bvid)
+    chars[3], chars[9] = chars[9], chars[3]
+    chars[4], chars[7] = chars[7], chars[4]
+    value = 0
+    for c in chars[3:]:
+        index = ALPHABET_INDEX.get(c)
+        if index is None:
+            return None
+        value = value * 58 + index
+    return (value & MASK_CODE) ^ XOR_CODE
+
+def av2bv(av):
+    """
+    把AV号编码成BV号。
+    """
+    chars = list("BV1000000000")
+    value = (MAX_AID | av) ^ XOR_CODE
+    index = len(chars) - 1
+    while value > 0:
+        chars[index] = ALPHABET[value % 58]
+        value //= 58
+        index -= 1
+    chars[3], chars[9] = chars[9], chars[3]
+    chars[4], chars[7] = chars[7], chars[4]
+    return "".join(chars)
+
+class SeenSet:
+    """
+    已检查过的视频集合。内部以AV号（int）保存，比保存BV字符串更省内存；
+    指定path时从排好序的uint64文件加载，并可以保存回去。
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.avs = set()
+        self.others = set()  # 无法解码成AV号的bvid
+        if path and os.path.exists(path):
+            stored = array('Q')
+            with open(path, 'rb') as f:
+                stored.frombytes(f.read())
+            self.avs.update(stored)
+            logger.info("已加载 %s 个已检查的视频: %s", len(stored), path)
+
+    def __len__(self):
+        return len(self.avs) + len(self.others)
+
+    def __contains__(self, bvid):
+        av = bv2av(bvid)
+        return bvid in self.others if av is None else av in self.avs
+
+    def add(self, bvid):
+        av = bv2av(bvid)
+        if av is None:
+            self.others.add(bvid)
+        else:
+            self.avs.add(av)
+
+    def discard(self, bvid):
+        av = bv2av(bvid)
+        if av is None:
+            self.others.discard(bvid)
+        else:
+            self.avs.discard(av)
+
+    def filter(self, items):
+        """
+        返回items中还没见过的视频（同一批内也去重），并把它们标记为已见。
+        """
+        fresh = []
+        for item in items:
+            bvid = item.bvid
+            if bvid not in self:
+                self.add(bvid)
+                fresh.append(item)
+        return fresh
+
+    def save(self):
+        if not self.path:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            array('Q', sorted(self.avs)).tofile(f)
+        os.replace(tmp_path, self.path)
+
+class SharedSeenSet:
+    """
+    多个进程共享的已检查视频集合，保存在SQLite（WAL模式）中，接口与SeenSet相同。
+    filter用 INSERT OR IGNORE 认领视频，同一个视频只会被一个进程检查。
+    """
+    def __init__(self, path = SHARED_SEEN_DB_PATH, timeout = SQLITE_TIMEOUT):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 自动提交模式，需要原子性的地方显式BEGIN
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        # key为AV号（int），无法解码的bvid保存原字符串
+        self.db.execute("CREATE TABLE IF NOT EXISTS seen (key PRIMARY KEY) WITHOUT ROWID")
+
+    @staticmethod
+    def _key(bvid):
+        av = bv2av(bvid)
+        return bvid if av is None else av
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def __contains__(self, bvid):
+        return self.db.execute("SELECT 1 FROM seen WHERE key = ?", (self._key(bvid),)).fetchone() is not None
+
+    def add(self, bvid):
+        self.db.execute("INSERT OR IGNORE INTO seen VALUES (?)", (self._key(bvid),))
+
+    def discard(self, bvid):
+        self.db.execute("DELETE FROM seen WHERE key = ?", (self._key(bvid),))
+
+    def filter(self, items):
+        """
+        返回items中还没有被任何进程认领的视频，并把它们标记为已见。
+        """
+        fresh = []
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            for item in items:
+                if self.db.execute("INSERT OR IGNORE INTO seen VALUES (?)", (self._key(item.bvid),)).rowcount:
+                    fresh.append(item)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return fresh
+
+    def load(self, seen):
+        """
+        导入一个SeenSet（例如从SEEN_FILE_PATH加载的），在启动worker之前调用。
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        self.db.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((av,) for av in seen.avs))
+        self.db.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((bvid,) for bvid in seen.others))
+        self.db.execute("COMMIT")
+
+    def dump(self, seen):
+        """
+        把所有已检查的视频导出到一个SeenSet，用于保存到SEEN_FILE_PATH。
+        """
+        for (key,) in self.db.execute("SELECT key FROM seen"):
+            if isinstance(key, int):
+                seen.avs.add(key)
+            else:
+                seen.others.add(key)
+
+    def clear(self):
+        self.db.execute("DELETE FROM seen")
+
+    def save(self):
+        # 每次filter/discard都已经提交
+        pass
+
+    def close(self):
+        self.db.close()
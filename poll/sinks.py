@@ -0,0 +1,43 @@
+import json
+import os
+from datetime import datetime
+
+def video_url(bvid):
+    return f"https://www.bilibili.com/video/{bvid}"
+
+def format_result(item):
+    return item.title + ' ' + video_url(item.bvid)
+
+def _ensure_parent(path):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+class TextSink:
+    """
+    每行一个 "标题 URL"，写入后立即flush，中途退出也不会丢结果。
+    """
+    def __init__(self, path="results.txt", append=False):
+        _ensure_parent(path)
+        self.f = open(path, 'a' if append else 'w', encoding='utf-8', buffering=1)
+
+    def write(self, item, keyword, found_at=None):
+        self.f.write(format_result(item) + '\n')
+
+    def close(self):
+        self.f.close()
+
+class JsonlSink:
+    """
+    每行一个JSON对象，包含命中的关键词和推荐接口返回的完整视频信息。
+    found_at为发现时间（ISO格式），从结果数据库导出时传入保存的时间，默认为当前时间。
+    """
+    def __init__(self, path="results.jsonl"):
+        _ensure_parent(path)
+        self.f = open(path, 'a', encoding='utf-8', buffering=1)
+
+    def write(self, item, keyword, found_at=None):
+        record = {"found_at": found_at or datetime.now().isoformat(), "keyword": keyword, "item": item.to_dict()}
+        self.f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    def close(self):
+        self.f.close()
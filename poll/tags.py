@@ -1,30 +1,64 @@
 import aiohttp
 import asyncio
-import json
-import os
-from datetime import datetime
+import logging
 from utils import *
+import metrics
+from client import get_session, shared_session, check_rate_limit, RateLimited, get_policy
+from .records import loads, DecodeError, parse_tags
 
-TAG_API_URL = "https://api.bilibili.com/x/web-interface/view/detail/tag"
+logger = logging.getLogger(__name__)
+
+TAG_API_URL = f"{API_BASE_URL}/x/web-interface/view/detail/tag"
+
+async def get_tags(bvid: str, session=None, cache=None, account=None, archive=None):
+    """
+    获取视频的tag列表（records.Tag）。提供cache时先查缓存，成功获取后写入缓存。
+    account为账号池中的账号，为空时使用默认Cookie。被限流时抛出RateLimited。
+    提供archive（ArchiveWriter）时把从网络获取的响应追加到归档。
+    超时、重试和对冲按client.POLICIES["tags"]执行。
+    """
+    if cache is not None:
+        tags_arr = cache.get(bvid)
+        if tags_arr is not None:
+            return tags_arr
+    provider = account.provider if account is not None else get_cookie_provider()
+    headers = provider.headers() or DEFAULT_HEADERS
+    session = session or get_session()
+
+    async def request(timeout):
+        async with session.get(TAG_API_URL, params={'bvid': bvid}, headers=headers, timeout=timeout) as response:
+            check_rate_limit(response.status)
+            response.raise_for_status()
+            raw = await response.read()
+            with metrics.timed('decode'):
+                response_json = loads(raw)
+            check_rate_limit(response.status, response_json.get('code'), response.url.path)
+            return response_json, raw
+
+    try:
+        response_json, raw = await get_policy("tags").run(request)
+        tags_arr = parse_tags(response_json.get('data'))
+        if archive is not None:
+            archive.write_raw("tags", bvid, raw)
+        if cache is not None and tags_arr is not None:
+            cache.put(bvid, tags_arr)
+        return tags_arr
+    except RateLimited:
+        raise
+    except aiohttp.ClientError as e:
+        logger.warning("网络请求错误: %s", e)
+        return None
+    except DecodeError:
+        logger.warning("API响应不是有效的JSON格式。")
+        return None
+    except Exception as e:
+        logger.error("获取tag时发生意外错误: %s", e)
+        return None
+
+async def main(bvid):
+    async with shared_session() as session:
+        print(await get_tags(bvid, session))
 
-async def get_tags(bvid: str):
-    headers = cookie_header(load_cookies())
-    async with aiohttp.ClientSession(headers=headers) as session:  
-        try:
-            async with session.get(TAG_API_URL, params={'bvid': bvid}) as response:
-                response.raise_for_status()
-                response_json = await response.json()
-                tags_arr = response_json['data']
-                return tags_arr
-        except aiohttp.ClientError as e:
-            print(f"[{datetime.now()}] 网络请求错误: {e}")
-            return None
-        except json.JSONDecodeError:
-            print(f"[{datetime.now()}] API响应不是有效的JSON格式。")
-            return None
-        except Exception as e:
-            print(f"[{datetime.now()}] 获取推荐列表时发生意外错误: {e}")
-            return None
-    
 if __name__ == '__main__':
-    asyncio.run(get_tags('BV1rXKFzBE9y'))
\ No newline at end of file
+    setup_logging()
+    asyncio.run(main('BV1rXKFzBE9y'))
@@ -1,8 +1,19 @@
 import os
-from datetime import datetime
+import time
 import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 接口地址前缀，可以通过环境变量指向本地的模拟服务器（见 bench/mock_api.py）
+API_BASE_URL = os.environ.get("BILI_API_BASE", "https://api.bilibili.com")
+PASSPORT_BASE_URL = os.environ.get("BILI_PASSPORT_BASE", "http://passport.bilibili.com")
+
+LOG_LEVEL = os.environ.get("BILI_LOG_LEVEL", "INFO") # 日志级别，设为DEBUG可以看到每个请求的详细信息
+LOG_FORMAT = "[%(asctime)s] %(levelname)s %(name)s: %(message)s"
 
 COOKIES_FILE_PATH = "cookies/bilibili_cookies.json"
+COOKIE_CHECK_INTERVAL = 5.0 # 检查Cookie文件是否变化的最短间隔（秒）
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Referer": "https://www.bilibili.com/",
@@ -16,23 +27,33 @@ DEFAULT_HEADERS = {
 TAG_SET = {'mygo', 'ave', 'mujica', 'gbc', 'girls band cry', 'bang', 'dream', '少女乐团派对', 
            '千早', '爱音', 'anon', '长崎', '素世', '爽世', 'soyo', '高松', '灯', '要', '乐奈', '椎名', '立希',
            '丰川', '祥子', 'saki', '三角', '初华', '若叶', '睦', '八幡', '海铃', '祐天寺', '若麦', '喵梦'}
+# 只出现在标题里就足以确定的关键词，标题命中时不再请求tag；TAG_SET中的其他关键词（如bang、dream）太常见，
+# 标题命中只会让视频优先检查tag
+TITLE_ACCEPT_SET = {'mygo', 'mujica', 'girls band cry', '少女乐团派对'}
+
+def setup_logging(level = None):
+    """
+    由命令行入口调用。各模块使用 logging.getLogger(__name__) 并以参数形式传入消息内容，
+    低于当前级别的日志不会格式化。
+    """
+    logging.basicConfig(level=(level or LOG_LEVEL).upper(), format=LOG_FORMAT)
 
 def load_cookies(file_path = COOKIES_FILE_PATH):
     """
     从JSON文件加载Cookie。
     """
     if not os.path.exists(file_path):
-        print(f"[{datetime.now()}] Cookie文件未找到: {file_path}")
+        logger.warning("Cookie文件未找到: %s", file_path)
         return None
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             cookies = json.load(f)
         return cookies
     except json.JSONDecodeError as e:
-        print(f"[{datetime.now()}] Cookie文件解析失败 (JSON格式错误): {e}")
+        logger.warning("Cookie文件解析失败 (JSON格式错误): %s", e)
         return None
     except Exception as e:
-        print(f"[{datetime.now()}] 加载Cookie文件时发生错误: {e}")
+        logger.warning("加载Cookie文件时发生错误: %s", e)
         return None
     
 def cookie_header(cookies):
@@ -40,3 +61,60 @@ def cookie_header(cookies):
     request_headers = DEFAULT_HEADERS.copy()
     request_headers['Cookie'] = cookie_str
     return request_headers
+
+class CookieProvider:
+    """
+    进程内缓存Cookie及由它生成的请求头，只在文件mtime变化（或调用invalidate）后重新加载。
+    mtime最多每COOKIE_CHECK_INTERVAL秒检查一次，热路径上不读文件。
+    返回的dict是共享的，调用方不要修改。
+    """
+    def __init__(self, file_path = COOKIES_FILE_PATH, check_interval = COOKIE_CHECK_INTERVAL):
+        self.file_path = file_path
+        self.check_interval = check_interval
+        self.mtime = None
+        self.next_check = 0.0
+        self._cookies = None
+        self._headers = None
+
+    def invalidate(self):
+        """
+        强制下次访问时重新检查文件。
+        """
+        self.mtime = None
+        self.next_check = 0.0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.file_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime == self.mtime:
+            return
+        self.mtime = mtime
+        self._cookies = load_cookies(self.file_path) if mtime is not None else None
+        self._headers = cookie_header(self._cookies) if self._cookies else None
+        if self._cookies:
+            logger.info("已加载Cookie: %s", self.file_path)
+
+    def cookies(self):
+        self._refresh()
+        return self._cookies
+
+    def headers(self):
+        """
+        带Cookie的完整请求头，没有可用Cookie时返回None。
+        """
+        self._refresh()
+        return self._headers
+
+_cookie_providers = {}
+
+def get_cookie_provider(file_path = COOKIES_FILE_PATH):
+    provider = _cookie_providers.get(file_path)
+    if provider is None:
+        provider = _cookie_providers[file_path] = CookieProvider(file_path)
+    return provider